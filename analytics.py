@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Single-pass per-user chat analytics"""
+
+from collections import Counter
+from itertools import islice
+import threading
+import numpy as np
+import pandas as pd
+import profiling
+from sentiment import SentimentBackend, default_backend
+from textproc import tokenize, words as split_words
+from timebuckets import TimeBuckets
+
+ANALYSIS_VERSION = "5" # bump whenever ChatAnalysis results change, cached chats are invalidated by it
+DEFAULT_RESOLUTIONS = ["hour", "weekday", "day", "month"] # always bucketed, other resolutions are opt-in
+EMPTY_SUMMARY = {
+    "num_messages": 0, "num_words": 0, "num_emojis": 0, "longest_msg": None,
+    "sentiment_sum": 0.0, "top_swear": None, "top_swear_polarity": None,
+}
+SUMMARY_COLUMNS = list(EMPTY_SUMMARY)
+
+
+class ChatAnalysis:
+    """Computes the metrics of every user in a chat in one pass, and can be extended with later messages"""
+
+    def __init__(self, df: pd.DataFrame, resolutions: list[str] = (), sentiment: SentimentBackend = default_backend):
+
+        self.users = []
+        self.sentiment = sentiment
+        self.word_freq, self.emoji_freq = {}, {}
+        # batches of every user's messages that were not scored for sentiment yet, in the order they were added: the span
+        # of rows with a user they came from, then their messages, words and rows unless the analysis was unpickled
+        self._pending = {}
+        self._rows = 0
+        # sentiment of every row with a user, NaN until it is scored
+        self.scores = np.empty(0)
+        self._source = None
+        self._lock = threading.Lock()
+        self.buckets = TimeBuckets(list(dict.fromkeys(DEFAULT_RESOLUTIONS + list(resolutions))))
+        self.summary = pd.DataFrame(columns=SUMMARY_COLUMNS)
+        self.extend(df, sentiment)
+
+    def __getstate__(self):
+
+        # the sentiment backend and its cache are not worth pickling, and unscored messages are read back by attach
+        state = dict(vars(self))
+        del state["sentiment"], state["_lock"], state["_source"]
+        state["_pending"] = {user: [batch[:2] for batch in batches] for user, batches in self._pending.items()}
+        return state
+
+    def __setstate__(self, state: dict):
+
+        vars(self).update(state, sentiment=default_backend, _lock=threading.Lock(), _source=None)
+
+    def attach(self, df: pd.DataFrame):
+        """Gives an unpickled analysis the dataframe it was built from, where its unscored messages are read back from"""
+
+        self._source = df.loc[df["user"].notna()].reset_index(drop=True)
+
+    def extend(self, df: pd.DataFrame, sentiment: SentimentBackend = None):
+        """Adds messages sent after the ones already analyzed, giving the same results as analyzing them all at once
+
+        Sentiment and top swears are only scored when score_sentiment asks for them.
+        """
+
+        if sentiment is not None: self.sentiment = sentiment
+        df = df.loc[df["user"].notna()].reset_index(drop=True)
+        users = df["user"].astype(object)
+        messages = df["message"].astype(object)
+        start, self._rows = self._rows, self._rows + len(df)
+        self.scores = np.concatenate([self.scores, np.full(len(df), np.nan)])
+        self.users += [user for user in users.unique() if user not in self.word_freq]
+
+        rows = len(df)
+        with profiling.span("ChatAnalysis.tokenize", rows): words, emojis = tokenize(users, messages)
+        with profiling.span("ChatAnalysis.word_emoji_freq", rows):
+            for user in self.users:
+                # Counter.update appends unseen keys, so first-appearance order carries over
+                self.word_freq.setdefault(user, Counter()).update(words.get(user, []))
+                self.emoji_freq.setdefault(user, Counter()).update(emojis.get(user, []))
+        with profiling.span("ChatAnalysis.time_buckets", rows):
+            self.buckets.add(df["timestamp"], users)
+            self.hour_freq = {user: self.buckets.freq("hour", user) for user in self.users}
+            self.weekday_freq = {user: self.buckets.freq("weekday", user) for user in self.users}
+            self.day_freq = {user: self.buckets.freq("day", user) for user in self.users}
+            self.month_freq = {user: self.buckets.freq("month", user) for user in self.users}
+
+        with profiling.span("ChatAnalysis.summary", rows), self._lock:
+            new_users = list(users.unique())
+            num_messages = users.value_counts()
+            longest = messages.str.len().groupby(users, sort=False).idxmax()
+            user_messages = messages.groupby(users, sort=False).agg(list)
+            user_rows = users.groupby(users, sort=False).indices
+
+            summary = self.summary.to_dict("index")
+            for user in new_users:
+                row = summary.setdefault(user, dict(EMPTY_SUMMARY))
+                row["num_messages"] += int(num_messages[user])
+                row["num_words"] += len(words[user])
+                row["num_emojis"] += len(emojis[user])
+                # ties keep the earlier message, like max() and min() over the whole chat would
+                if row["longest_msg"] is None or len(messages[longest[user]]) > len(row["longest_msg"]): row["longest_msg"] = messages[longest[user]]
+                self._pending.setdefault(user, []).append((start, self._rows, user_messages[user], words[user], start + user_rows[user]))
+
+            summary = pd.DataFrame.from_dict(summary, orient="index", columns=SUMMARY_COLUMNS).reindex(self.users)
+            summary["avg_msg_len"] = summary["num_words"] / summary["num_messages"]
+            self.summary = summary
+            self._sentiment_polarity()
+
+    def _sentiment_polarity(self):
+        """Recomputes the average sentiment column, NaN for users with unscored messages"""
+
+        polarity = self.summary["sentiment_sum"] / self.summary["num_messages"]
+        self.summary["sentiment_polarity"] = polarity.mask(self.summary.index.isin(list(self._pending)))
+
+    def _texts(self, user: str, batch: tuple):
+        """Messages, words and rows of a pending batch, read back from the attached dataframe after unpickling"""
+
+        start, stop, *texts = batch
+        if texts: return texts
+        if self._source is None: raise RuntimeError("unpickled ChatAnalysis needs attach(df) before scoring sentiment")
+        rows = self._source.iloc[start:stop]
+        mask = (rows["user"] == user).to_numpy()
+        messages = rows.loc[mask, "message"].astype(object).tolist()
+        return messages, split_words("\n".join(messages)), start + np.flatnonzero(mask)
+
+    def score_sentiment(self, users: list[str] = None):
+        """Scores the messages and words of some users (all by default) that are not scored yet"""
+
+        with self._lock:
+            users = [user for user in (self.users if users is None else users) if user in self._pending]
+            if not users: return
+            with profiling.span("ChatAnalysis.sentiment") as event:
+                batches = {user: [self._texts(user, batch) for batch in self._pending[user]] for user in users}
+                for user in users: del self._pending[user]
+                event["rows"] = sum(len(messages) for user in users for messages, _, _ in batches[user])
+                # everything is scored in two batches so texts shared between users hit the sentiment cache
+                message_scores = iter(np.array(self.sentiment.polarity(
+                    [message for user in users for messages, _, _ in batches[user] for message in messages]), dtype=float))
+                word_scores = iter(np.array(self.sentiment.polarity(
+                    [word for user in users for _, words, _ in batches[user] for word in words]), dtype=float))
+
+                for user in users:
+                    sentiment_sum, top_swear, top_polarity = self.summary.loc[user, ["sentiment_sum", "top_swear", "top_swear_polarity"]]
+                    for messages, words, rows in batches[user]:
+                        # continuing the running sum adds the scores in the same order as one sum over the whole chat
+                        self.scores[rows] = np.fromiter(islice(message_scores, len(messages)), dtype=float, count=len(messages))
+                        sentiment_sum = sum(self.scores[rows].tolist(), sentiment_sum)
+                        scores = np.fromiter(islice(word_scores, len(words)), dtype=float, count=len(words))
+                        if len(scores) and scores.min() < 0 and (pd.isna(top_swear) or scores.min() < top_polarity):
+                            top_swear, top_polarity = words[scores.argmin()], float(scores.min())
+                    self.summary.loc[user, ["sentiment_sum", "top_swear", "top_swear_polarity"]] = [sentiment_sum, top_swear, top_polarity]
+                self._sentiment_polarity()
+
+
+class UserStats:
+    """Lightweight view of one user's precomputed metrics"""
+
+    @profiling.profiled()
+    def __init__(self, username: str, analysis: ChatAnalysis):
+
+        summary = analysis.summary.loc[username]
+        self.analysis = analysis
+        self.username = username
+        self.word_freq = analysis.word_freq[username]
+        self.emoji_freq = analysis.emoji_freq[username]
+        self.longest_msg = summary["longest_msg"]
+        self.hour_freq = analysis.hour_freq[username]
+        self.weekday_freq = analysis.weekday_freq[username]
+        self.day_freq = analysis.day_freq[username]
+        self.month_freq = analysis.month_freq[username]
+        self.num_words = int(summary["num_words"])
+        self.num_emojis = int(summary["num_emojis"])
+        self.num_messages = int(summary["num_messages"])
+        self.avg_msg_len = float(summary["avg_msg_len"])
+
+    @property
+    def sentiment_polarity(self):
+        """Average message sentiment, scored on first use"""
+
+        self.analysis.score_sentiment([self.username])
+        return float(self.analysis.summary.at[self.username, "sentiment_polarity"])
+
+    @property
+    def top_swear(self):
+        """Most negative word or None, scored on first use"""
+
+        self.analysis.score_sentiment([self.username])
+        top_swear = self.analysis.summary.at[self.username, "top_swear"]
+        return None if pd.isna(top_swear) else top_swear
@@ -1,185 +1,14 @@
 #!/usr/bin/env python3
+# pandas, TextBlob and the views built on them are imported on first use, so the window opens without waiting for them
+# pylint: disable=import-outside-toplevel
 
-from collections import Counter, OrderedDict
-import emoji
+from collections import OrderedDict
+import threading
 import flet as ft
-import pandas as pd
-from textblob import TextBlob
-
-DIVIDER = "="*48
-BAR_CHAR = "█"
-AUTOMATED_MESSAGES = ["<Media omitted>", "Missed voice call"]
-PUNCTUATIONS = r".,!\?;:()[]{}"
-WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-ENG_COMMON_WORDS = [
-    #Articles
-    'a', 'an', 'the',
-    #Conjunctions
-    'for', 'and', 'nor', 'but', 'or', 'yet', 'so',
-    #Pronouns
-    'i', 'me', 'my', 'mine', 'myself', 'you', 'your', 'yours', 'yourself',
-    'he', 'him', 'his', 'himself', 'she', 'her', 'hers', 'herself', 'it',
-    'its', 'itself', 'we', 'us', 'our', 'ours', 'ourselves', 'yourselves',
-    'they', 'them', 'their', 'theirs', 'themselves', 'that',
-    #Prepositions
-    'above', 'across', 'against', 'along', 'among', 'around', 'at', 'before',
-    'behind', 'below', 'beneath', 'beside', 'between', 'by', 'down', 'from',
-    'in', 'into', 'near', 'of', 'off', 'on', 'to', 'toward', 'under', 'upon',
-    'with', 'within'
-]
-
-def get_dt_format(data: pd.Series):
-    """Get the datetime format used in the chat file"""
-
-    set1, set2 = set(), set() # month and year sets
-    for element in data:
-        date = element[0]
-        n1, n2, _ = date.split("/")
-        set1.add(n1)
-        set2.add(n2)
-    if len(set1) > len(set2): return "%d/%m/%y %I:%M %p"
-    elif len(set1) < len(set2): return "%m/%d/%y %I:%M %p"
-    else: return ValueError("unknown datetime format")
-
-
-def frame_data(path: str):
-    """Scrapes Whatsapp chat export file and creates a dataframe"""
-
-    with open(path, "r", encoding="utf-8") as file:
-        # groups: date, time, meridiem, sender, message
-        pattern = r"(\d*?/\d*?/\d*?), (\d*?:\d*?)\s([Aa]|[Pp][Mm]) - (.*?): (.*)"
-        data = pd.Series(file.read()).str.findall(pattern)[0]
-
-    df = pd.DataFrame(columns=["timestamp", "user", "message"])
-    for element in data:
-        date, time, meridiem, sender, message = element
-        time = f"{time} {meridiem}"
-        if message in AUTOMATED_MESSAGES: message = ""
-        timestamp = pd.to_datetime(f"{date} {time}", format=get_dt_format(data))
-        df.loc[len(df)] = [timestamp, sender, message]
-
-    if not df.empty: print("dataframe generated")
-    return df
-
-class User:
-    """Class to represent a chat user"""
-
-    def __init__(self, username: str, df: pd.DataFrame, color: str = None):
-
-        _df = df.loc[df["user"] == username]
-        _words = [word.strip(PUNCTUATIONS+" ").lower() for msg in _df["message"] for word in msg.split()]
-        _emojis = [char for msg in _df["message"] for char in msg if emoji.is_emoji(char)]
-        _words = [word for word in _words if word.isalpha() and word not in ENG_COMMON_WORDS]
-
-        self.username = username
-        self.color = color
-        self.word_freq = Counter(_words)
-        self.emoji_freq = Counter(_emojis)
-        self.longest_msg = max(df.loc[df["user"] == username]["message"], key=len)
-        self.hour_freq = Counter(pd.Timestamp(timestamp).strftime("%I %p") for timestamp in _df["timestamp"])
-        self.weekday_freq = Counter(pd.Timestamp(timestamp).strftime("%a") for timestamp in _df["timestamp"])
-        self.day_freq = Counter(pd.Timestamp(timestamp).strftime("%d/%m/%y") for timestamp in _df["timestamp"])
-        self.month_freq = Counter(pd.Timestamp(timestamp).strftime("%m/%y") for timestamp in _df["timestamp"])
-        self.weekday_freq = Counter(OrderedDict(sorted(self.weekday_freq.items(), key=lambda x: WEEKDAYS.index(x[0]))))
-        self.hour_freq = Counter(OrderedDict(sorted(self.hour_freq.items())))
-        self.num_words = sum(self.word_freq.values())
-        self.num_emojis = sum(self.emoji_freq.values())
-        self.num_messages = len(_df)
-        self.avg_msg_len = self.num_words / self.num_messages
-        self.sentiment_polarity = sum(TextBlob(msg).sentiment.polarity for msg in _df["message"]) / self.num_messages
-        self.top_swear = min(_words, key = lambda word: TextBlob(word).sentiment.polarity) if _words else None
-        self.top_swear = self.top_swear if self.top_swear == None or TextBlob(self.top_swear).sentiment.polarity < 0 else None
-        self.top_hour = self.hour_freq.most_common(1)[0][0]
-
-    def graph_freq(self, freq: Counter, title: str, page: ft.Page):
-        """Returns a Unicode bar graph for a given frequency distribution"""
-
-        if not freq: return ft.Text(None)
-        title = title.title()
-        words, bars = ft.Column(spacing=0), ft.Column(spacing=0)
-        top = freq.most_common(1)[0][1]
-        # total = sum(freq.values())
-        scale = page.window_width/22.5
-        for element, count in freq.most_common(5):
-            len_bar = int(round(count / top * scale))
-            words.controls.append(ft.Row([ft.Text(element)]))
-            bars.controls.append(ft.Row([ft.Text("|"), ft.Text(BAR_CHAR*len_bar, color=self.color, ), ft.Text(count)]))
-        
-        graph = ft.Column([ft.Row([ft.Text(title)], alignment="center"), ft.Row([words, bars])])
-        return graph
-
-    def display(self, page: ft.Page):
-        """Displays user information"""
-
-        return ft.Column([
-            ft.Row([ft.Text("Messages sent:"), ft.Text(self.num_messages, color=self.color)]),
-            ft.Row([ft.Text("Avg msg length:"), ft.Text(round(self.avg_msg_len, 2), color=self.color), ft.Text("words")]),
-            ft.Row([ft.Text("Longest msg:"), ft.Text(len(self.longest_msg), color=self.color), ft.Text("chars")]),
-            ft.Row([ft.Text("Words sent:"), ft.Text(self.num_words, color=self.color)]),
-            ft.Row([ft.Text("Emojis sent:"), ft.Text(self.num_emojis, color=self.color)]),
-            self.graph_freq(self.word_freq, "top words", page),
-            self.graph_freq(self.emoji_freq, "top emojis", page),
-            ft.Row([ft.Text("Top swear:"), ft.Text(self.top_swear if self.top_swear != None else "None", color=self.color)]),
-            ft.Row([ft.Text("Left on read coefficient:"), ft.Text(NotImplemented, color=self.color)]),
-            ft.Row([ft.Text("Most active at:"), ft.Text(self.top_hour, color=self.color)]),
-            ft.Row([ft.Text("Average message sentiment:"), ft.Text(round(self.sentiment_polarity, 2), color=self.color)])
-            # self.graph_freq(self.emoji_freq, "top emojis")
-        ]) #width=600, alignment="center"
-
-
-def stacked_graph(data: dict[str: Counter], title:str, page: ft.Page):
-    """Returns a Unicode bar graph for a given frequency distribution"""
-
-    scale = page.window_width/45
-    freq_distribution = {element: [] for freq in data.values() for element in freq}
-    for user, freq in data.items():
-        for key, value in freq.items():
-            freq_distribution[key].append({user: value})
- 
-    # total = sum(freq.total() for freq in data.values())
-    top = freq.most_common(1)[0][1]
-    graph = ft.Column()
-    elements, bars = ft.Column(spacing=0), ft.Column(spacing=0)
-    title = title.title()
-    for element, distribution in freq_distribution.items():
-        bar = ft.Row(spacing=0)
-        for freq in distribution:
-            for user, count in freq.items():
-                len_bar = int(round(count / top * scale))
-                bar.controls.append(ft.Text(f"{BAR_CHAR*len_bar}", color=user.color))
-        # only add the bar if it's not empty (it's empty if the length was rounded to 0)
-        if len_bar >= 1:
-            elements.controls.append(ft.Text(element))
-            bars.controls.append(bar)
-        
-        graph = ft.Column([ft.Row([ft.Text(title)], alignment="center"), ft.Row([elements, bars])])
-
-    return graph
-
-
-def chat_stats(users: list[User], df: pd.DataFrame, page: ft.Page):
-    """chat statistics"""
-
-    if len(users) > 10: return ft.Text("Choose a user")
-
-    total_words = sum(user.num_words for user in users)
-    total_emojis = sum(user.num_emojis for user in users)
-    words_sent, emojis_sent = ft.Row(), ft.Row()
-    if total_words: words_sent = ft.Row([ft.Text(f"{BAR_CHAR*int(round(user.num_words/total_words*15))}", color=user.color) for user in users], spacing=0)
-    if total_emojis: emojis_sent = ft.Row([ft.Text(f"{BAR_CHAR*int(round(user.num_emojis/total_emojis*15))}", color=user.color) for user in users], spacing=0)
-    day_freq = Counter()
-    for user in users: day_freq += user.day_freq
-
-    return ft.Column([
-        ft.Row([ft.Text("Words sent |"), words_sent]),
-        ft.Row([ft.Text("Emojis sent |"), emojis_sent]),
-        stacked_graph({user: user.month_freq for user in users}, "timeline", page),
-        ft.Row([ft.Text("Most active day:"), ft.Text(day_freq.most_common(1)[0][0], color=None)]), # color by top user that day
-        stacked_graph({user: user.weekday_freq for user in users}, "activity by weekday", page),
-        stacked_graph({user: user.hour_freq for user in users}, "activity by hour", page),
-        ft.Row([ft.Text("Average message sentiment:"), ft.Text(round(sum(user.sentiment_polarity for user in users)/len(users), 2))]), # color by top user sentiment
-        ft.Row([ft.Text("(Positive > 0 > Negative)")])
-    ])
+from jobs import Cancelled, Job
+import profiling
+
+VIEW_CACHE_SIZE = 16 # user views kept around after they were shown
 
 
 def main(page: ft.Page):
@@ -195,53 +24,212 @@ def main(page: ft.Page):
 
     def pick_files_result(e: ft.FilePickerResultEvent):
         filename.value = " ,".join(map(lambda f: f.name, e.files)) if e.files else "Cancelled!"
-        path.value = " ,".join(map(lambda f: f.path, e.files)) if e.files else None
+        # several exports of the same chat, such as yearly backups, are merged into one
+        paths[:] = [f.path for f in e.files] if e.files else []
         btn.text = filename.value
         print(f"{filename.value} loaded")
         btn.update()
-        analyze_chat()
+        if paths: analyze_chat()
+
+    def user_view(username: str):
+        """Display of a user, built on first selection and kept in a bounded LRU"""
+
+        if username in user_views:
+            user_views.move_to_end(username)
+            return user_views[username]
+        view = user_views[username] = users[username].display(page)
+        while len(user_views) > VIEW_CACHE_SIZE: user_views.popitem(last=False)
+        return view
+
+    def page_resize(e):
+        # the bar layouts are reused, only their scale changes
+        with ui_lock:
+            if not shown or user_select.value is not None: return
+            from views import chat_stats # already imported once there are stats to redraw
+            selected_user_data.controls = [chat_stats(shown["authors"], shown["stats"], page, shown["sentiment"], shown["layouts"])]
+        page.update()
+
+    def range_change(e):
+        """Shows the chat stats of the months picked, queried from the index instead of analyzing them again"""
+
+        from views import chat_stats, month_range, range_sentiment
+        with ui_lock:
+            index, authors = shown.get("index"), shown.get("authors")
+            if index is None or range_from.value is None or range_to.value is None: return
+            first, last = sorted([int(range_from.value), int(range_to.value)])
+        stats = month_range(index, first, last)
+        sentiment, layouts = ft.Text(range_sentiment(stats)), {}
+        view = chat_stats(authors, stats, page, sentiment, layouts)
+        with ui_lock:
+            if shown.get("index") is not index: return
+            shown.update(stats=stats, sentiment=sentiment, layouts=layouts)
+            if user_select.value is None: selected_user_data.controls = [view]
+        page.update()
+        print(f"range changed to: {stats.start.date()} - {stats.end.date()}")
 
     def dropdown_change(e):
         selected_user = user_select.value
-        selected_user_data.controls = users[selected_user].controls
+        view = user_view(selected_user)
+        with ui_lock: selected_user_data.controls = view.controls
         page.update()
         print(f"user changed to: {selected_user}")
 
+    def save_profile_result(e: ft.FilePickerResultEvent):
+        if not e.path: return
+        profiling.export(e.path)
+        print(f"profile saved to {e.path}")
+
+    page.on_resize = page_resize
     pick_files_dialog = ft.FilePicker(on_result=pick_files_result)
+    save_profile_dialog = ft.FilePicker(on_result=save_profile_result)
     filename = ft.Text(italic=True)
-    path = ft.Text()
+    paths = []
     selected_user = ""
+    job_status = ft.Column()
     selected_user_data = ft.Column([ft.Row([ft.Text("Choose a file")])])
-    page.overlay.append(pick_files_dialog)
+    page.overlay.extend([pick_files_dialog, save_profile_dialog])
 
-    btn = ft.ElevatedButton("Pick files", icon=ft.icons.UPLOAD_FILE, on_click=lambda _: pick_files_dialog.pick_files(allowed_extensions=["txt"]))
+    btn = ft.ElevatedButton("Pick files", icon=ft.icons.UPLOAD_FILE, on_click=lambda _: pick_files_dialog.pick_files(allowed_extensions=["txt"], allow_multiple=True))
     user_select = ft.Dropdown(expand=True, disabled=True, hint_text="User", on_change=dropdown_change)
+    range_from = ft.Dropdown(expand=True, disabled=True, hint_text="From", on_change=range_change)
+    range_to = ft.Dropdown(expand=True, disabled=True, hint_text="To", on_change=range_change)
     page.add(ft.Row([btn, user_select]))
+    page.add(ft.Row([range_from, range_to]))
+    if profiling.enabled():
+        # *.trace.json saves a Chrome trace, *.json a report and anything else a text table
+        page.add(ft.TextButton("Save profile", icon=ft.icons.TIMER,
+                               on_click=lambda _: save_profile_dialog.save_file(file_name="chat-analyzer.trace.json")))
     page.add(ft.Divider())
+    page.add(job_status)
     page.add(selected_user_data)
     
     users = dict()
-    def analyze_chat():
-
-        selected_user_data.controls = [ft.ProgressBar()]
+    user_views = OrderedDict()
+    shown = dict() # what the chat stats on screen were built from, to redraw them at another size
+    chat_cache = None
+    cache_lock = threading.Lock()
+    # held while the page is changed, so a cancelled job can't publish over the next one
+    ui_lock = threading.Lock()
+    current_job = None
+
+    def open_cache():
+        """The chat cache, opened by whichever of the warm-up and the first analysis gets to it first"""
+
+        nonlocal chat_cache
+        with cache_lock:
+            if chat_cache is None:
+                from cache import ChatCache
+                chat_cache = ChatCache()
+        return chat_cache
+
+    def warm_up(job: Job):
+        """Imports the analysis stack and loads the sentiment lexicon once the window is up, so the first chat doesn't wait"""
+
+        import sentiment
+        import views # pylint: disable=unused-import
+        open_cache()
+        sentiment.warm_up()
+        print("warmed up")
+
+    def publish(job: Job, update):
+        """Applies an update to the page and shows it, unless the job was cancelled"""
+
+        with ui_lock:
+            job.check()
+            update()
         page.update()
-        df = frame_data(path.value)
-        colors = ["#1EB980", "#FF6859", "#FFCF44", "#B15DFF", "#72DEFF"]
-        authors = list()
-
-        options = list()
-        for i, username in enumerate(df["user"].unique()):
-            color = colors[i % len(colors)]
-            user = User(username, df, color)
-            authors.append(user)
-            users[username] = user.display(page)
-            options.append(ft.dropdown.Option(username))
 
-        print("analysis complete")
-        selected_user_data.controls = [chat_stats(authors, df, page)]
-        user_select.options = options
-        user_select.disabled = False
-        # selected_user_data.controls = [ft.Text("CHAT STATISTICS")]
+    def show_error(job: Job, error: Exception):
+        """Shows why a job failed"""
+
+        def update():
+            job_status.controls = [ft.Text(f"Could not analyze the chat: {error}", color="#FF6859")]
+        try: publish(job, update)
+        except Cancelled: pass
+
+    def analyze_chat():
+        nonlocal current_job
+
+        with ui_lock:
+            # a running job stops at its next check instead of delaying this one
+            if current_job is not None: current_job.cancel()
+            users.clear()
+            shown.clear()
+            user_views.clear()
+            user_select.options = []
+            user_select.value = None
+            user_select.disabled = True
+            for dropdown in (range_from, range_to):
+                dropdown.options = []
+                dropdown.value = None
+                dropdown.disabled = True
+            job_status.controls = [ft.Text("Loading"), ft.ProgressBar(value=0)]
+            selected_user_data.controls = []
         page.update()
+        job = current_job = Job(run_analysis, list(paths))
+        job.on_error = lambda error: show_error(job, error)
+        job.start()
+
+    def run_analysis(job: Job, chat_paths: list[str]):
+        """Loads and analyzes a chat on a worker thread, publishing results as they are ready"""
+
+        from cache import load_chats
+        from query import ChatIndex
+        from views import average_sentiment, chat_stats, chat_users, month_options
+        def progress(stage: str, fraction: float):
+            def update():
+                status, bar = job_status.controls
+                status.value = f"{stage.title()} {fraction:.0%}" if stage == "parsing" else stage.title()
+                bar.value = fraction if stage == "parsing" else None
+            publish(job, update)
+
+        df, analysis = load_chats(chat_paths, open_cache(), progress=progress)
+        if not df.empty: print("dataframe generated")
+        authors = chat_users(analysis)
+        # only the chat summary is built up front, user views wait for their first selection
+        sentiment = ft.Text("...")
+        layouts = {}
+        stats = chat_stats(authors, analysis, page, sentiment, layouts)
+
+        def summary():
+            users.update((user.username, user) for user in authors)
+            job_status.controls = [ft.Text("Scoring sentiment"), ft.ProgressBar()]
+            user_select.options = [ft.dropdown.Option(username) for username in analysis.users]
+            user_select.disabled = False
+            selected_user_data.controls = [stats]
+            shown.update(authors=authors, stats=analysis, sentiment=sentiment, layouts=layouts)
+        publish(job, summary)
+        print("analysis complete")
+
+        for user in authors:
+            job.check()
+            analysis.score_sentiment([user.username])
+        # the cache was written before sentiment was scored, so reopening the chat doesn't score it again
+        open_cache().store_analysis(chat_paths, analysis)
+
+        def done():
+            job_status.controls = [ft.Text("Indexing"), ft.ProgressBar()] if analysis.users else []
+            sentiment.value = average_sentiment(authors)
+        publish(job, done)
+        if not analysis.users: return
+
+        # date ranges are answered by the index, built after the summary so it doesn't delay it
+        # it reuses the scores of the analysis, range sentiment is summed on the first query that asks for it
+        index = ChatIndex(df, check=job.check, scores=analysis.scores)
+        options = month_options(index)
+
+        def ranges():
+            job_status.controls = []
+            shown["index"] = index
+            for dropdown in (range_from, range_to):
+                dropdown.options = options
+                dropdown.disabled = False
+            range_from.value, range_to.value = options[0].key, options[-1].key
+        publish(job, ranges)
+
+    Job(warm_up).start()
+
+
+if __name__ == "__main__":
+    ft.app(target=main)
 
-ft.app(target=main)
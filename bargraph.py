@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Layout of stacked bar graphs, computed once and rescaled to any width"""
+
+import numpy as np
+
+MAX_USERS = 8 # users drawn in a bar, the rest are stacked together as "others"
+OTHERS_COLOR = "#9E9E9E"
+CACHED_WIDTHS = 4 # widths whose segments are kept, so going back and forth between window sizes is free
+
+
+class BarLayout:
+    """Stacked bars of per-user counts over buckets, empty buckets dropped and quiet users grouped as others"""
+
+    def __init__(self, counts: np.ndarray, colors: list[str], labels: list[str], max_users: int = MAX_USERS):
+
+        counts = np.asarray(counts, dtype=np.int64).reshape(len(colors), len(labels))
+        colors = list(colors)
+        if len(counts) > max_users:
+            # the busiest users keep their own segment, in their original order
+            keep = np.sort(np.argsort(-counts.sum(axis=1), kind="stable")[:max_users - 1])
+            others = np.delete(counts, keep, axis=0).sum(axis=0)
+            counts = np.vstack([counts[keep], others])
+            colors = [colors[i] for i in keep] + [OTHERS_COLOR]
+        self.colors = colors
+        nonempty = counts.sum(axis=0) > 0
+        self.labels = [label for label, keep in zip(labels, nonempty) if keep]
+        self.counts = counts[:, nonempty]
+        # where every segment ends as a share of the longest bar, rounding the ends keeps each bar's total length right
+        self.ends = np.cumsum(self.counts, axis=0) / max(self.counts.sum(axis=0).max(initial=0), 1)
+        self._segments = {}
+
+    def lengths(self, width: int):
+        """Segment lengths in characters, one row per user (and others) and one column per bar"""
+
+        return np.diff(np.rint(self.ends * width).astype(int), axis=0, prepend=0)
+
+    def segments(self, width: int):
+        """(color, length) runs of every bar, dropping empty segments and merging neighbours of the same color"""
+
+        if width in self._segments: return self._segments[width]
+        bars = []
+        for column in self.lengths(width).T:
+            runs = []
+            for i in np.flatnonzero(column):
+                if runs and runs[-1][0] == self.colors[i]: runs[-1][1] += int(column[i])
+                else: runs.append([self.colors[i], int(column[i])])
+            bars.append(runs)
+        self._segments[width] = bars
+        while len(self._segments) > CACHED_WIDTHS: del self._segments[next(iter(self._segments))]
+        return bars
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Analyzes many chat exports without the GUI, one JSON or CSV record per chat and per user"""
+# pylint: disable=invalid-name, multiple-statements
+# the analysis stack is imported by the first analysis, so --help and argument errors don't wait for pandas
+# pylint: disable=import-outside-toplevel
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import json
+import os
+import sys
+import time
+import profiling
+
+CHAT_FIELDS = ["type", "path", "messages", "users", "words", "emojis", "first", "last", "sentiment_polarity", "seconds", "error"]
+USER_FIELDS = ["user", "num_messages", "num_words", "num_emojis", "avg_msg_len", "longest_msg", "top_word", "top_emoji",
+               "top_hour", "sentiment_polarity", "top_swear"]
+FIELDS = list(dict.fromkeys(CHAT_FIELDS + USER_FIELDS))
+
+
+def chat_paths(inputs: list[str], pattern: str = ".txt"):
+    """Files given directly plus the exports found under the given directories, in a stable order"""
+
+    paths = []
+    for path in inputs:
+        if not os.path.isdir(path):
+            paths.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            paths += [os.path.join(root, file) for file in sorted(files) if file.endswith(pattern)]
+    return paths
+
+
+def user_record(path: str, user, sentiment: bool):
+    """Flat record of one user's metrics"""
+
+    top = lambda freq: freq.most_common(1)[0][0] if freq else None
+    return {
+        "type": "user", "path": path, "user": user.username, "num_messages": user.num_messages,
+        "num_words": user.num_words, "num_emojis": user.num_emojis, "avg_msg_len": round(user.avg_msg_len, 4),
+        "longest_msg": len(user.longest_msg), "top_word": top(user.word_freq), "top_emoji": top(user.emoji_freq),
+        "top_hour": top(user.hour_freq),
+        "sentiment_polarity": round(user.sentiment_polarity, 4) if sentiment else None,
+        "top_swear": user.top_swear if sentiment else None,
+    }
+
+
+@profiling.profiled()
+def analyze_file(path: str, dt_format: str = None, sentiment: bool = True):
+    """Chat and user records of one export, run inside worker processes
+
+    Any error ends up in an error record so one bad file doesn't stop the batch.
+    """
+
+    from analytics import ChatAnalysis, UserStats
+    from chat_parser import parse_chat
+    start = time.perf_counter()
+    try:
+        df = parse_chat(path, dt_format)
+        analysis = ChatAnalysis(df)
+        if sentiment: analysis.score_sentiment()
+        users = [user_record(path, UserStats(username, analysis), sentiment) for username in analysis.users]
+    except Exception as error: # pylint: disable=broad-except
+        return [{"type": "error", "path": path, "error": f"{type(error).__name__}: {error}",
+                 "seconds": round(time.perf_counter() - start, 4)}]
+
+    summary = analysis.summary
+    chat = {
+        "type": "chat", "path": path, "messages": int(summary["num_messages"].sum()), "users": len(analysis.users),
+        "words": int(summary["num_words"].sum()), "emojis": int(summary["num_emojis"].sum()),
+        "first": df["timestamp"].min().isoformat() if len(df) else None,
+        "last": df["timestamp"].max().isoformat() if len(df) else None,
+        "sentiment_polarity": round(float(summary["sentiment_polarity"].mean()), 4) if sentiment and users else None,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    return [chat] + users
+
+
+def profiled_analysis(path: str, dt_format: str, sentiment: bool, profile: bool, memory: bool):
+    """analyze_file inside a worker process, along with the profiling spans it recorded"""
+
+    if profile: profiling.enable(memory=memory)
+    records = analyze_file(path, dt_format, sentiment)
+    return records, profiling.drain()
+
+
+def run_batch(paths: list[str], workers: int = 1, dt_format: str = None, sentiment: bool = True, profile_memory: bool = False):
+    """Yields the records of every export as soon as its analysis is done
+
+    Worker processes profile like the main one, recording memory deltas as well when profile_memory is set.
+    """
+
+    if workers <= 1:
+        for path in paths: yield analyze_file(path, dt_format, sentiment)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(profiled_analysis, path, dt_format, sentiment, profiling.enabled(), profile_memory): path for path in paths}
+        for future in as_completed(futures):
+            # a worker that died takes its file down with it, not the batch
+            try: records, spans = future.result()
+            except Exception as error: # pylint: disable=broad-except
+                records, spans = [{"type": "error", "path": futures[future], "error": f"{type(error).__name__}: {error}"}], []
+            profiling.merge(spans)
+            yield records
+
+
+class RecordWriter:
+    """Streams records out as JSON lines or CSV rows"""
+
+    def __init__(self, file, output_format: str = "json"):
+
+        self.file = file
+        self.format = output_format
+        if output_format == "csv":
+            self.writer = csv.DictWriter(file, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, records: list[dict]):
+        """Writes records and flushes them, so a long batch can be followed as it runs"""
+
+        for record in records:
+            if self.format == "csv": self.writer.writerow(record)
+            else: self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+
+def main():
+    """Batch command line"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("inputs", nargs="+", help="chat exports or directories to search for .txt exports")
+    parser.add_argument("-o", "--output", help="file to write the records to (default: stdout)")
+    parser.add_argument("-f", "--format", choices=["json", "csv"], default="json", help="JSON lines or CSV")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--dt-format", help="datetime format of the exports (default: detected per file)")
+    parser.add_argument("--no-sentiment", action="store_true", help="skip sentiment and top swears, the slowest metrics")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="save a profile of every stage, a Chrome trace for *.trace.json, a JSON report for *.json, else a text table")
+    parser.add_argument("--profile-memory", action="store_true", help="also record memory deltas in the profile (slower)")
+    args = parser.parse_args()
+
+    if args.profile: profiling.enable(memory=args.profile_memory)
+
+    paths = chat_paths(args.inputs)
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    writer = RecordWriter(output, args.format)
+    start = time.perf_counter()
+    done = failed = messages = 0
+    try:
+        for records in run_batch(paths, args.workers, args.dt_format, not args.no_sentiment, args.profile_memory):
+            writer.write(records)
+            if records[0]["type"] == "error":
+                failed += 1
+                print(f"failed: {records[0]['path']}: {records[0]['error']}", file=sys.stderr)
+            else:
+                done += 1
+                messages += records[0]["messages"]
+    finally:
+        if args.output: output.close()
+
+    seconds = max(time.perf_counter() - start, 1e-9)
+    size = sum(os.path.getsize(path) for path in paths if os.path.isfile(path)) / 2**20
+    print(f"{done} chats analyzed, {failed} failed in {seconds:.2f}s with {args.workers} workers | "
+          f"{len(paths)/seconds:.2f} files/sec {messages/seconds:,.0f} messages/sec {size/seconds:.2f} MB/sec", file=sys.stderr)
+    if args.profile:
+        profiling.export(args.profile)
+        print(f"profile saved to {args.profile}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
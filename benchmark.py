@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""Benchmarks for the chat analyzer"""
+# pylint: disable=invalid-name, multiple-statements
+
+import argparse
+from collections import Counter, OrderedDict
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import emoji
+import numpy as np
+import pandas as pd
+from textblob import TextBlob
+from analytics import ChatAnalysis, UserStats
+from bargraph import BarLayout
+from cache import ChatCache, load_chat
+from timebuckets import WEEKDAYS
+from chat_parser import HEADER, PATTERN, merge_chats, parse_chat, parse_chats
+from query import ChatIndex
+from dateformats import detect_format, timestamp_strings
+from sentiment import SentimentBackend, textblob_polarity
+from textproc import ENG_COMMON_WORDS, PUNCTUATIONS, tokenize
+
+USERS = ["Alice", "Bob", "Carol", "Dave", "Erin"]
+WORDS = ["hello", "lol", "ok", "see", "you", "tomorrow", "the", "party", "was", "great", "😂", "👍🏽"]
+TEXT_WORDS = [word for word in WORDS if word.isascii()]
+EMOJIS = ["😂", "👍🏽", "❤️", "🇮🇳", "👩‍👩‍👧", "🔥"]
+LEGACY_PATTERN = r"(\d*?/\d*?/\d*?), (\d*?:\d*?)\s([Aa]|[Pp][Mm]) - (.*?): (.*)"
+# message header of every export layout, "legacy" is always PM so the legacy parser can read it
+LAYOUTS = {
+    "legacy": "{t:%m/%d/%y}, {hour12}:{t:%M} PM - ",
+    "us": "{t:%m/%d/%y}, {hour12}:{t:%M} {t:%p} - ",
+    "eu": "{t:%d/%m/%Y}, {t:%H:%M} - ",
+    "de": "{t:%d.%m.%y}, {t:%H:%M} - ",
+    "ios": "[{t:%d/%m/%y}, {t:%H:%M:%S}] ",
+    "iso": "{t:%Y-%m-%d}, {t:%H:%M} - ",
+}
+NOISE_SECONDS = 0.01 # differences a suite stage can't regress by, whatever the threshold
+NOISE_MB = 1
+# entry points first, then the modules they import; app needs flet and is reported as unavailable without it
+STARTUP_MODULES = ["app", "old", "batch", "views", "textreport", "cache", "query", "analytics", "chat_parser", "sentiment", "textproc", "profiling"]
+HEAVY_MODULES = ["numpy", "pandas", "pyarrow", "emoji", "textblob", "nltk", "flet"]
+PATTERN_START = re.compile(rf"^(?={HEADER})", re.MULTILINE) # splits an export before every message
+
+
+def synthetic_chat(path: str, num_lines: int, users: list[str] = USERS, multiline_ratio: float = 0, seed: int = 0,
+                   layout: str = "legacy", emoji_ratio: float = None):
+    """Writes a synthetic WhatsApp export with num_lines messages
+
+    emoji_ratio is the share of tokens that are emojis, by default they are just two of the words.
+    """
+
+    rng = random.Random(seed)
+    header = LAYOUTS[layout]
+    timestamp = pd.Timestamp("2020-01-01 12:00").to_pydatetime()
+    step = pd.Timedelta(minutes=1).to_pytimedelta()
+
+    def text():
+        tokens = rng.randint(1, 12)
+        if emoji_ratio is None: return " ".join(rng.choices(WORDS, k=tokens))
+        return " ".join(rng.choice(EMOJIS) if rng.random() < emoji_ratio else rng.choice(TEXT_WORDS) for _ in range(tokens))
+
+    with open(path, "w", encoding="utf-8") as file:
+        for _ in range(num_lines):
+            timestamp += step * rng.randint(1, 90)
+            message = text()
+            if rng.random() < multiline_ratio: message += "\n" + text()
+            file.write(header.format(t=timestamp, hour12=timestamp.hour % 12 or 12) + f"{rng.choice(users)}: {message}\n")
+
+
+def legacy_frame_data(path: str):
+    """Row-by-row parser frame_data used before chat_parser, kept as a baseline"""
+
+    with open(path, "r", encoding="utf-8") as file:
+        data = pd.Series(file.read()).str.findall(LEGACY_PATTERN)[0]
+
+    df = pd.DataFrame(columns=["timestamp", "user", "message"])
+    for date, _time, meridiem, sender, message in data:
+        timestamp = pd.to_datetime(f"{date} {_time} {meridiem}", format="%m/%d/%y %I:%M %p")
+        df.loc[len(df)] = [timestamp, sender, message]
+    return df
+
+
+class LegacyUser:
+    """Per-user constructor that scanned the whole dataframe, kept as a baseline"""
+
+    def __init__(self, username: str, df: pd.DataFrame):
+
+        _df = df.loc[df["user"] == username]
+        _words, _emojis = legacy_tokens(_df["message"])
+
+        self.username = username
+        self.word_freq = Counter(_words)
+        self.emoji_freq = Counter(_emojis)
+        self.longest_msg = max(df.loc[df["user"] == username]["message"], key=len)
+        self.hour_freq = Counter(pd.Timestamp(timestamp).strftime("%I %p") for timestamp in _df["timestamp"])
+        self.weekday_freq = Counter(pd.Timestamp(timestamp).strftime("%a") for timestamp in _df["timestamp"])
+        self.day_freq = Counter(pd.Timestamp(timestamp).strftime("%d/%m/%y") for timestamp in _df["timestamp"])
+        self.month_freq = Counter(pd.Timestamp(timestamp).strftime("%m/%y") for timestamp in _df["timestamp"])
+        self.weekday_freq = Counter(OrderedDict(sorted(self.weekday_freq.items(), key=lambda x: WEEKDAYS.index(x[0]))))
+        self.hour_freq = Counter(OrderedDict(sorted(self.hour_freq.items())))
+        self.num_words = sum(self.word_freq.values())
+        self.num_emojis = sum(self.emoji_freq.values())
+        self.num_messages = len(_df)
+        self.avg_msg_len = self.num_words / self.num_messages
+        self.sentiment_polarity = sum(TextBlob(msg).sentiment.polarity for msg in _df["message"]) / self.num_messages
+        self.top_swear = min(_words, key = lambda word: TextBlob(word).sentiment.polarity) if _words else None
+        self.top_swear = self.top_swear if self.top_swear == None or TextBlob(self.top_swear).sentiment.polarity < 0 else None
+
+
+def legacy_tokens(messages: pd.Series):
+    """Per-character emoji and per-word list tokenizing of the old constructor"""
+
+    _words = [word.strip(PUNCTUATIONS+" ").lower() for msg in messages for word in msg.split()]
+    _emojis = [char for msg in messages for char in msg if emoji.is_emoji(char)]
+    _words = [word for word in _words if word.isalpha() and word not in list(ENG_COMMON_WORDS)]
+    return _words, _emojis
+
+
+def same_stats(user, legacy: LegacyUser):
+    """Whether two user objects hold the same metrics, tie order of the top words included"""
+
+    # emoji sequences such as 👍🏽 are one emoji for textproc but one per code point for the old constructor
+    return all(getattr(user, name) == getattr(legacy, name) for name in vars(legacy) if name not in ["emoji_freq", "num_emojis"]) and (
+        user.word_freq.most_common() == legacy.word_freq.most_common())
+
+
+def timed(func, *args, **kwargs):
+    """Returns the result of a call and the seconds it took"""
+
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_parse(sizes: list[int], legacy_limit: int, multiline_ratio: float):
+    """Parser throughput in lines/sec and dataframe memory"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"chat_{size}.txt")
+            synthetic_chat(path, size, multiline_ratio=multiline_ratio)
+            df, seconds = timed(parse_chat, path)
+            memory = df.memory_usage(deep=True).sum() / 2**20
+            object_memory = df.astype(object).memory_usage(deep=True).sum() / 2**20
+            line = (f"parse_chat      {size:>9} lines {seconds:8.3f}s {size/seconds:12,.0f} lines/sec"
+                    f" {memory:9.1f} MB (object dtype {object_memory:.1f} MB)")
+            if size <= legacy_limit and not multiline_ratio:
+                legacy, legacy_seconds = timed(legacy_frame_data, path)
+                assert legacy.astype(str).equals(df[legacy.columns].astype(str))
+                line += f" | legacy {legacy_seconds:8.3f}s {size/legacy_seconds:10,.0f} lines/sec"
+            print(line)
+
+
+def bench_users(group_sizes: list[int], num_lines: int):
+    """Per-user metrics: one ChatAnalysis pass against a LegacyUser per participant"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for group_size in group_sizes:
+            path = os.path.join(tmp, f"group_{group_size}.txt")
+            synthetic_chat(path, num_lines, users=[f"User {i}" for i in range(group_size)])
+            df = parse_chat(path)
+            analysis, seconds = timed(ChatAnalysis, df)
+            _, sentiment_seconds = timed(analysis.score_sentiment)
+            users = [UserStats(username, analysis) for username in analysis.users]
+            legacy, legacy_seconds = timed(lambda: [LegacyUser(username, df) for username in analysis.users])
+            assert all(same_stats(user, old) for user, old in zip(users, legacy))
+            total = seconds + sentiment_seconds
+            print(f"{group_size:>4} users {num_lines:>8} lines | ChatAnalysis {seconds:8.3f}s + sentiment {sentiment_seconds:8.3f}s"
+                  f" | LegacyUser {legacy_seconds:8.3f}s | {legacy_seconds/total:6.1f}x")
+
+
+def bench_sentiment(num_messages: int, workers: int):
+    """Sentiment scoring in messages/sec with a cold and a warm cache"""
+
+    rng = random.Random(0)
+    messages = [" ".join(rng.choices(WORDS, k=rng.randint(1, 12))) for _ in range(num_messages)]
+    baseline, baseline_seconds = timed(lambda: [TextBlob(message).sentiment.polarity for message in messages])
+    backend = SentimentBackend(textblob_polarity, workers=workers)
+    cold, cold_seconds = timed(backend.polarity, messages)
+    warm, warm_seconds = timed(backend.polarity, messages)
+    assert baseline == cold == warm
+    print(f"{num_messages:>8} messages, {len(set(messages))} distinct, {workers} workers")
+    for name, seconds in [("TextBlob per message", baseline_seconds), ("cold cache", cold_seconds), ("warm cache", warm_seconds)]:
+        print(f"{name:<22} {seconds:8.3f}s {num_messages/seconds:12,.0f} messages/sec")
+
+
+def bench_text(num_lines: int):
+    """Word and emoji extraction: textproc against the old per-character loop"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat.txt")
+        synthetic_chat(path, num_lines)
+        df = parse_chat(path)
+    users, messages = df["user"].astype(object), df["message"].astype(object)
+    (words, emojis), seconds = timed(tokenize, users, messages)
+    legacy, legacy_seconds = timed(lambda: {user: legacy_tokens(messages[users == user]) for user in users.unique()})
+    assert all(list(words[user]) == legacy[user][0] for user in legacy)
+    print(f"{num_lines:>8} lines | textproc {seconds:8.3f}s {num_lines/seconds:12,.0f} lines/sec"
+          f" | per-character loop {legacy_seconds:8.3f}s {num_lines/legacy_seconds:10,.0f} lines/sec")
+    print(f"emojis: {sum(map(len, emojis.values()))} sequences, {sum(len(legacy[user][1]) for user in legacy)} code points")
+
+
+def bench_cache(num_lines: int):
+    """Opening a chat with a cold and a warm on-disk cache"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat.txt")
+        synthetic_chat(path, num_lines)
+        cache = ChatCache(os.path.join(tmp, "cache"))
+        (df, analysis), cold_seconds = timed(load_chat, path, cache)
+        (cached_df, cached_analysis), warm_seconds = timed(load_chat, path, cache)
+        assert cached_df.equals(df) and cached_analysis.summary.equals(analysis.summary)
+        print(f"{num_lines:>8} lines | parse + analyze + store {cold_seconds:8.3f}s | cached {warm_seconds:8.3f}s")
+
+
+def bench_incremental(num_lines: int, new_lines: int):
+    """Reopening a chat export after messages were appended to it, against analyzing it from scratch"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat.txt")
+        synthetic_chat(path, num_lines + new_lines)
+        with open(path, "r", encoding="utf-8") as file: lines = file.readlines()
+        with open(path, "w", encoding="utf-8") as file: file.writelines(lines[:num_lines])
+        cache = ChatCache(os.path.join(tmp, "cache"))
+        load_chat(path, cache)
+        with open(path, "a", encoding="utf-8") as file: file.writelines(lines[num_lines:])
+
+        (df, analysis), seconds = timed(load_chat, path, cache)
+        full_df, full_seconds = timed(parse_chat, path)
+        full_analysis, analysis_seconds = timed(ChatAnalysis, full_df)
+        full_seconds += analysis_seconds
+        assert df.equals(full_df) and analysis.summary.equals(full_analysis.summary)
+        assert all(analysis.word_freq[user] == full_analysis.word_freq[user] for user in full_analysis.users)
+        print(f"{num_lines:>8} + {new_lines} lines | incremental {seconds:8.3f}s | from scratch {full_seconds:8.3f}s"
+              f" | {full_seconds/seconds:6.1f}x")
+
+
+def render_text(analysis: ChatAnalysis):
+    """Text report of every user and the chat graphs, as the command line version draws them"""
+
+    import textreport # pylint: disable=import-outside-toplevel
+    users = [textreport.User(username, analysis) for username in analysis.users]
+    report = "".join(user.display() for user in users)
+    for resolution in ["month", "weekday", "hour"]:
+        report += textreport.stacked_graph(dict(zip(users, analysis.buckets.counts[resolution])), analysis.buckets.labels[resolution])
+    return report
+
+
+def suite_stages(path: str):
+    """(name, setup, run) of every pipeline stage, run(setup()) is what gets measured"""
+
+    with open(path, "r", encoding="utf-8") as file: matches = PATTERN.findall(file.read())
+    dates, times, meridiems = (pd.Series(column, dtype=object) for column in list(zip(*matches))[:3])
+    df = parse_chat(path)
+    scored = ChatAnalysis(df)
+    scored.score_sentiment()
+
+    def convert(_):
+        stamps = timestamp_strings(dates, times, meridiems)
+        return pd.to_datetime(stamps, format=detect_format(dates, times, meridiems))
+
+    return [
+        ("parse", lambda: path, parse_chat),
+        ("datetime", lambda: None, convert),
+        ("analysis", lambda: df, ChatAnalysis),
+        # a fresh backend each time, so sentiment is measured with a cold cache
+        ("sentiment", lambda: ChatAnalysis(df, sentiment=SentimentBackend()), lambda analysis: analysis.score_sentiment()),
+        ("rendering", lambda: scored, render_text),
+    ]
+
+
+def measure(setup, run, repeat: int):
+    """Best time of repeat runs and the peak traced memory of one more, in MB"""
+
+    seconds = []
+    for _ in range(repeat):
+        arg = setup()
+        seconds.append(timed(run, arg)[1])
+    arg = setup()
+    # tracing slows everything down, so memory is measured on a separate run
+    tracemalloc.start()
+    run(arg)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return {"seconds": round(min(seconds), 4), "peak_mb": round(peak, 2)}
+
+
+def git_commit():
+    """Short hash of the checked out commit or None"""
+
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+
+def regressions(results: dict, baseline: dict, threshold: float):
+    """Stages that got slower or used more memory than the baseline by more than threshold"""
+
+    found = []
+    for name, stage in results["stages"].items():
+        old_stage = baseline["stages"].get(name)
+        if old_stage is None: continue
+        for metric, noise in [("seconds", NOISE_SECONDS), ("peak_mb", NOISE_MB)]:
+            new, old_value = stage[metric], old_stage[metric]
+            # tiny absolute differences are noise, however large they are relatively
+            if new > old_value * (1 + threshold) and new - old_value > noise:
+                found.append(f"{name} {metric}: {old_value} -> {new} (+{(new/old_value - 1) if old_value else float('inf'):.0%})")
+    return found
+
+
+def bench_suite(num_lines: int, num_users: int, layout: str, emoji_ratio: float, multiline_ratio: float, repeat: int,
+                output: str, baseline: str, threshold: float):
+    """Times every pipeline stage and its peak memory on a synthetic chat, comparing against a saved baseline"""
+
+    params = {"lines": num_lines, "users": num_users, "layout": layout, "emoji_ratio": emoji_ratio,
+              "multiline_ratio": multiline_ratio, "repeat": repeat}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat.txt")
+        synthetic_chat(path, num_lines, [f"User {i}" for i in range(num_users)], multiline_ratio, layout=layout, emoji_ratio=emoji_ratio)
+        stages = {}
+        for name, setup, run in suite_stages(path):
+            stages[name] = measure(setup, run, repeat)
+            print(f"{name:<10} {stages[name]['seconds']:8.3f}s {num_lines/max(stages[name]['seconds'], 1e-9):12,.0f} lines/sec"
+                  f" {stages[name]['peak_mb']:9.1f} MB peak")
+
+    results = {"commit": git_commit(), "python": platform.python_version(), "pandas": pd.__version__,
+               "params": params, "stages": stages,
+               "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1)}
+    if output:
+        with open(output, "w", encoding="utf-8") as file: json.dump(results, file, indent=2)
+        print(f"results saved to {output}")
+    if not baseline: return 0
+
+    with open(baseline, "r", encoding="utf-8") as file: previous = json.load(file)
+    if previous["params"] != params: print(f"warning: baseline was run with {previous['params']}")
+    found = regressions(results, previous, threshold)
+    for regression in found: print(f"REGRESSION {regression}")
+    if not found: print(f"no stage regressed by more than {threshold:.0%} against {baseline} ({previous.get('commit')})")
+    return 1 if found else 0
+
+
+def legacy_bars(counts: np.ndarray, colors: list[str], labels: list[str], scale: int):
+    """Bars of the old stacked_graph, one segment per user with messages in a bucket, kept as a baseline"""
+
+    lengths = np.rint(counts / max(counts.max(initial=0), 1) * scale).astype(int)
+    bars = []
+    for i, label in enumerate(labels):
+        if not lengths[:, i].any(): continue
+        bars.append((label, [(color, "█"*length) for color, count, length in zip(colors, counts[:, i], lengths[:, i]) if count]))
+    return bars
+
+
+def layout_bars(layout: BarLayout, scale: int):
+    """Bars of stacked_graph as (label, segments)"""
+
+    return [(label, [(color, "█"*length) for color, length in runs]) for label, runs in zip(layout.labels, layout.segments(scale)) if runs]
+
+
+def controls(bars: list):
+    """flet controls stacked_graph creates for some bars: a label, a row and a Text per segment each"""
+
+    return sum(2 + len(segments) for _, segments in bars)
+
+
+def bench_graph(group_sizes: list[int], num_buckets: int, repeat: int):
+    """stacked_graph controls and render time for large groups: BarLayout against a segment per user and bucket"""
+
+    rng = np.random.default_rng(0)
+    colors = ["#1EB980", "#FF6859", "#FFCF44", "#B15DFF", "#72DEFF"]
+    labels = [f"{i % 12 + 1:02d}/{20 + i // 12}" for i in range(num_buckets)]
+    for group_size in group_sizes:
+        # a few busy users and a long tail, like most group chats
+        activity = 50 / np.arange(1, group_size + 1)
+        counts = rng.poisson(activity[:, None], size=(group_size, num_buckets))
+        user_colors = [colors[i % len(colors)] for i in range(group_size)]
+        legacy, legacy_seconds = timed(lambda: [legacy_bars(counts, user_colors, labels, 8) for _ in range(repeat)])
+        layout, first_seconds = timed(lambda: BarLayout(counts, user_colors, labels))
+        bars, render_seconds = timed(lambda: [layout_bars(layout, 8 + i) for i in range(repeat)])
+        _, cached_seconds = timed(lambda: [layout_bars(layout, 8) for _ in range(repeat)])
+        print(f"{group_size:>4} users {num_buckets} buckets | controls {controls(legacy[0]):>6} -> {controls(bars[0]):>5}"
+              f" | old render {legacy_seconds/repeat*1e3:7.2f}ms | layout {first_seconds*1e3:6.2f}ms"
+              f" resize {render_seconds/repeat*1e3:6.2f}ms same size {cached_seconds/repeat*1e3:6.2f}ms")
+
+
+def bench_query(num_lines: int, num_users: int, repeat: int):
+    """Date range and user subset stats from ChatIndex, against analyzing the filtered chat again"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat.txt")
+        synthetic_chat(path, num_lines, [f"user{i}" for i in range(num_users)], seed=1)
+        df = parse_chat(path)
+    index, index_seconds = timed(ChatIndex, df)
+    first, last = df["timestamp"].min().normalize(), df["timestamp"].max().normalize()
+    middle = first + (last - first) / 2
+    print(f"{num_lines:>8} lines {num_users} users | index built in {index_seconds:.3f}s")
+    queries = {
+        "whole chat": (None, None, None),
+        "one month": (pd.Timestamp(middle.year, middle.month, 1), pd.Timestamp(middle.year, middle.month, 1) + pd.offsets.MonthEnd(), None),
+        "partial months": (first + pd.Timedelta(days=10), middle + pd.Timedelta(days=10), None),
+        "two users": (None, None, index.users[:2]),
+        "no users": (None, None, []),
+    }
+    for name, (start, end, users) in queries.items():
+        stats, seconds = timed(lambda: [index.query(start, end, users) for _ in range(repeat)])
+        stats = stats[0]
+        selected = df["user"].notna()
+        if start is not None: selected &= df["timestamp"] >= start
+        if end is not None: selected &= df["timestamp"] < end + pd.Timedelta(days=1)
+        if users is not None: selected &= df["user"].isin(users)
+        analysis, analysis_seconds = timed(ChatAnalysis, df[selected])
+        assert all(counts.shape == (len(stats.users), len(stats.buckets.labels[key])) for key, counts in stats.buckets.counts.items())
+        for user in analysis.users:
+            row, expected = stats.users.index(user), analysis.users.index(user)
+            assert all((stats.buckets.counts[key][row] == analysis.buckets.counts[key][expected]).all() for key in ["hour", "weekday"])
+            assert stats.word_freq[user] == analysis.word_freq[user] and stats.emoji_freq[user] == analysis.emoji_freq[user]
+            assert (stats.summary.loc[user, ["num_messages", "num_words", "num_emojis"]].tolist()
+                    == analysis.summary.loc[user, ["num_messages", "num_words", "num_emojis"]].tolist())
+        print(f"{name:>16} | query {seconds/repeat*1e3:8.2f}ms | analyze again {analysis_seconds*1e3:8.2f}ms"
+              f" | {analysis_seconds/(seconds/repeat):6.1f}x")
+
+
+def bench_merge(num_lines: int, num_exports: int, overlap: float, workers: int):
+    """Several overlapping exports of one chat parsed in a worker pool and merged, against parsing them one by one"""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chat.txt")
+        synthetic_chat(path, num_lines, multiline_ratio=0.05, layout="us")
+        with open(path, "r", encoding="utf-8") as file: messages = PATTERN_START.split(file.read())[1:]
+        # equal slices of the chat, each one also repeating the end of the previous export
+        size = len(messages) // num_exports
+        paths = []
+        for i in range(num_exports):
+            export = os.path.join(tmp, f"export{i}.txt")
+            with open(export, "w", encoding="utf-8") as file:
+                file.writelines(messages[max(i * size - int(size * overlap), 0):len(messages) if i == num_exports - 1 else (i + 1) * size])
+            paths.append(export)
+
+        full = parse_chat(path)
+        singles = [timed(parse_chat, export)[1] for export in paths]
+        frames, pool_seconds = timed(parse_chats, paths, workers=workers)
+        df, merge_seconds = timed(merge_chats, frames)
+        assert df.equals(full) and merge_chats(frames[::-1]).equals(full)
+        print(f"{num_lines:>8} lines in {num_exports} exports, {overlap:.0%} overlap | one by one {sum(singles):7.3f}s"
+              f" | largest {max(singles):7.3f}s | {workers} workers {pool_seconds:7.3f}s + merge {merge_seconds:6.3f}s")
+
+
+def import_time(module: str):
+    """Seconds a fresh interpreter takes to start and import a module, the import alone, and the heavy modules it loaded"""
+
+    code = ("import sys, time; start = time.perf_counter(); import {module}; seconds = time.perf_counter() - start; "
+            "print(seconds, *[name for name in {heavy} if name in sys.modules])").format(module=module, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=False,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    process_seconds = time.perf_counter() - start
+    if result.returncode: raise ImportError(result.stderr.strip().splitlines()[-1])
+    seconds, *heavy = result.stdout.split()
+    return process_seconds, float(seconds), heavy
+
+
+def bench_startup(modules: list[str], repeat: int):
+    """Time to window of the entry points and import time of every module, each in a fresh interpreter"""
+
+    baseline = min(timed(subprocess.run, [sys.executable, "-c", "pass"], check=True)[1] for _ in range(repeat))
+    print(f"interpreter startup {baseline*1e3:7.1f}ms")
+    for module in modules:
+        try: runs = [import_time(module) for _ in range(repeat)]
+        except ImportError as error:
+            print(f"{module:>12} | unavailable: {error}")
+            continue
+        process_seconds, seconds, heavy = min(runs)
+        # entry points open their window or prompt right after their imports, so the process time is their time to first screen
+        print(f"{module:>12} | process {process_seconds*1e3:7.1f}ms | import {min(run[1] for run in runs)*1e3:7.1f}ms"
+              f" | loads {', '.join(heavy) or 'nothing heavy'}")
+
+
+def main():
+    """Benchmark command line"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="bench", required=True)
+    parse = subparsers.add_parser("parse", help=bench_parse.__doc__)
+    parse.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parse.add_argument("--legacy-limit", type=int, default=10_000, help="largest size to also run the legacy parser on")
+    parse.add_argument("--multiline-ratio", type=float, default=0, help="share of messages spanning two lines")
+    users = subparsers.add_parser("users", help=bench_users.__doc__)
+    users.add_argument("--groups", type=int, nargs="+", default=[2, 20, 200], help="number of users per chat")
+    users.add_argument("--lines", type=int, default=20_000)
+    sentiment = subparsers.add_parser("sentiment", help=bench_sentiment.__doc__)
+    sentiment.add_argument("--messages", type=int, default=100_000)
+    sentiment.add_argument("--workers", type=int, default=1)
+    text = subparsers.add_parser("text", help=bench_text.__doc__)
+    text.add_argument("--lines", type=int, default=100_000)
+    cache = subparsers.add_parser("cache", help=bench_cache.__doc__)
+    cache.add_argument("--lines", type=int, default=100_000)
+    incremental = subparsers.add_parser("incremental", help=bench_incremental.__doc__)
+    incremental.add_argument("--lines", type=int, default=100_000)
+    incremental.add_argument("--new-lines", type=int, default=1_000, help="messages appended after the first load")
+    graph = subparsers.add_parser("graph", help=bench_graph.__doc__)
+    graph.add_argument("--groups", type=int, nargs="+", default=[5, 50, 200, 1000], help="number of users per chat")
+    graph.add_argument("--buckets", type=int, default=60, help="bars per graph, such as months of a timeline")
+    graph.add_argument("--repeat", type=int, default=20)
+    query = subparsers.add_parser("query", help=bench_query.__doc__)
+    query.add_argument("--lines", type=int, default=100_000)
+    query.add_argument("--users", type=int, default=5)
+    query.add_argument("--repeat", type=int, default=5)
+    merge = subparsers.add_parser("merge", help=bench_merge.__doc__)
+    merge.add_argument("--lines", type=int, default=400_000)
+    merge.add_argument("--exports", type=int, default=4)
+    merge.add_argument("--overlap", type=float, default=0.1, help="share of each export repeating the previous one")
+    merge.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    startup = subparsers.add_parser("startup", help=bench_startup.__doc__)
+    startup.add_argument("--modules", nargs="+", default=STARTUP_MODULES)
+    startup.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module, the fastest one counts")
+    suite = subparsers.add_parser("suite", help=bench_suite.__doc__)
+    suite.add_argument("--lines", type=int, default=100_000)
+    suite.add_argument("--users", type=int, default=5)
+    suite.add_argument("--layout", choices=list(LAYOUTS), default="us", help="date format of the message headers")
+    suite.add_argument("--emoji-ratio", type=float, default=0.1, help="share of tokens that are emojis")
+    suite.add_argument("--multiline-ratio", type=float, default=0.05, help="share of messages spanning two lines")
+    suite.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest one counts")
+    suite.add_argument("--output", help="JSON file to save the results to")
+    suite.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    suite.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown or memory growth per stage")
+    args = parser.parse_args()
+
+    if args.bench == "parse": bench_parse(args.sizes, args.legacy_limit, args.multiline_ratio)
+    elif args.bench == "users": bench_users(args.groups, args.lines)
+    elif args.bench == "sentiment": bench_sentiment(args.messages, args.workers)
+    elif args.bench == "text": bench_text(args.lines)
+    elif args.bench == "cache": bench_cache(args.lines)
+    elif args.bench == "incremental": bench_incremental(args.lines, args.new_lines)
+    elif args.bench == "graph": bench_graph(args.groups, args.buckets, args.repeat)
+    elif args.bench == "query": bench_query(args.lines, args.users, args.repeat)
+    elif args.bench == "merge": bench_merge(args.lines, args.exports, args.overlap, args.workers)
+    elif args.bench == "startup": bench_startup(args.modules, args.repeat)
+    elif args.bench == "suite":
+        sys.exit(bench_suite(args.lines, args.users, args.layout, args.emoji_ratio, args.multiline_ratio, args.repeat,
+                             args.output, args.baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
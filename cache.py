@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""On-disk cache of parsed and analyzed chats"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+import pandas as pd
+import profiling
+from analytics import ANALYSIS_VERSION, ChatAnalysis
+from chat_parser import PARSER_VERSION, STRING_DTYPE, concat_chats, merge_chats, parse_chat, parse_chats
+
+CACHE_DIR = os.environ.get("CHAT_ANALYZER_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "chat-analyzer"))
+MAX_BYTES = 1 << 30
+VERSION = f"{PARSER_VERSION}:{ANALYSIS_VERSION}"
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def export_stat(path: str | list[str]):
+    """Path, size and mtime the index keeps of an export, or of several exports merged into one chat in any order"""
+
+    paths = [path] if isinstance(path, str) else sorted(map(os.path.abspath, path))
+    stats = [os.stat(file) for file in paths]
+    return "\n".join(map(os.path.abspath, paths)), sum(stat.st_size for stat in stats), max(stat.st_mtime_ns for stat in stats)
+
+
+def content_hash(path: str, size: int = None):
+    """blake2b digest of a file's contents, or of its first size bytes"""
+
+    digest = hashlib.blake2b(digest_size=20)
+    remaining = os.path.getsize(path) if size is None else size
+    with open(path, "rb") as file:
+        while remaining > 0 and (chunk := file.read(min(HASH_CHUNK_SIZE, remaining))):
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+class ChatCache:
+    """Parsed dataframes (Feather) and analyses (pickle) keyed by file fingerprint, evicted least recently used first"""
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            columns = [column for _, column, *_ in db.execute("PRAGMA table_info(entries)")]
+            if columns and "content_hash" not in columns:
+                # an index from before prefix hashes were kept is dropped along with its files
+                for key, in db.execute("SELECT key FROM entries"):
+                    for file in self._files(key):
+                        if os.path.exists(file): os.remove(file)
+                db.execute("DROP TABLE entries")
+            db.execute("""CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, path TEXT, size INTEGER, mtime_ns INTEGER,
+                version TEXT, dt_format TEXT, bytes INTEGER, last_used REAL,
+                content_hash TEXT, detected_format TEXT)""")
+            stale = [key for key, in db.execute("SELECT key FROM entries WHERE version != ?", (VERSION,))]
+        # entries written by another parser or analysis version are never valid again
+        self._remove(stale)
+
+    def _connect(self):
+        """A fresh connection, so the cache can be used from any thread"""
+
+        return sqlite3.connect(os.path.join(self.directory, "index.sqlite"))
+
+    def _files(self, key: str):
+        """Dataframe and analysis files of an entry"""
+
+        return os.path.join(self.directory, f"{key}.feather"), os.path.join(self.directory, f"{key}.pkl")
+
+    def _remove(self, keys: list[str]):
+        """Deletes entries and their files"""
+
+        for key in keys:
+            for file in self._files(key):
+                if os.path.exists(file): os.remove(file)
+        with self._connect() as db: db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+
+    def fingerprint(self, path: str | list[str], dt_format: str = None):
+        """Cache key and content hash of a chat export or of several merged ones, only hashing the contents when
+        paths, sizes or mtimes changed
+        """
+
+        abspath, size, mtime_ns = export_stat(path)
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT key, content_hash FROM entries WHERE path = ? AND size = ? AND mtime_ns = ? AND dt_format IS ?",
+                (abspath, size, mtime_ns, dt_format)).fetchone()
+        if row: return row
+        paths = [path] if isinstance(path, str) else sorted(map(os.path.abspath, path))
+        digest = content_hash(paths[0]) if len(paths) == 1 else hashlib.blake2b(
+            ":".join(map(content_hash, paths)).encode(), digest_size=20).hexdigest()
+        return hashlib.blake2b(f"{digest}:{VERSION}:{dt_format}".encode(), digest_size=20).hexdigest(), digest
+
+    def key(self, path: str | list[str], dt_format: str = None):
+        """Cache key of a chat export"""
+
+        return self.fingerprint(path, dt_format)[0]
+
+    def _read(self, key: str):
+        """Dataframe and analysis of an entry or None when its files are gone"""
+
+        df_file, analysis_file = self._files(key)
+        if not (os.path.exists(df_file) and os.path.exists(analysis_file)): return None
+        df = pd.read_feather(df_file)
+        df["message"] = df["message"].astype(STRING_DTYPE)
+        with open(analysis_file, "rb") as file: analysis = pickle.load(file)
+        analysis.attach(df)
+        with self._connect() as db:
+            df.attrs["dt_format"] = db.execute("SELECT detected_format FROM entries WHERE key = ?", (key,)).fetchone()[0]
+        return df, analysis
+
+    def load(self, path: str | list[str], dt_format: str = None):
+        """Cached (dataframe, analysis) of a chat export, or of several merged ones, or None"""
+
+        key = self.key(path, dt_format)
+        cached = self._read(key)
+        if cached is None: return None
+        with self._connect() as db:
+            db.execute("UPDATE entries SET path = ?, size = ?, mtime_ns = ?, last_used = ? WHERE key = ?",
+                       (*export_stat(path), time.time(), key))
+        return cached
+
+    def load_prefix(self, path: str, dt_format: str = None):
+        """Cached (dataframe, analysis, size) of an earlier export of the same chat that the file only appends to, or None"""
+
+        size = os.path.getsize(path)
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT key, size, content_hash FROM entries WHERE path = ? AND size < ? AND dt_format IS ? ORDER BY size DESC",
+                (os.path.abspath(path), size, dt_format)).fetchall()
+        for key, prefix_size, digest in rows:
+            # the old export has to be byte for byte the start of the new one
+            if content_hash(path, prefix_size) != digest: continue
+            cached = self._read(key)
+            if cached is not None: return (*cached, prefix_size)
+        return None
+
+    def store(self, path: str | list[str], df: pd.DataFrame, analysis: ChatAnalysis, dt_format: str = None):
+        """Caches the dataframe and analysis of a chat export, or of several merged ones, then evicts entries over the size limit"""
+
+        key, digest = self.fingerprint(path, dt_format)
+        df_file, analysis_file = self._files(key)
+        df.reset_index(drop=True).to_feather(df_file)
+        with open(analysis_file, "wb") as file: pickle.dump(analysis, file, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(df_file) + os.path.getsize(analysis_file)
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key, *export_stat(path), VERSION, dt_format, size, time.time(), digest, df.attrs.get("dt_format")))
+            rows = db.execute("SELECT key, bytes FROM entries ORDER BY last_used DESC").fetchall()
+
+        total, evicted = 0, []
+        for entry, size in rows:
+            total += size
+            if total > self.max_bytes and entry != key: evicted.append(entry)
+        self._remove(evicted)
+
+    def store_analysis(self, path: str | list[str], analysis: ChatAnalysis, dt_format: str = None):
+        """Rewrites the cached analysis of a chat export, such as once its sentiment is scored, if it is still cached"""
+
+        key = self.key(path, dt_format)
+        df_file, analysis_file = self._files(key)
+        if not os.path.exists(df_file): return
+        with open(analysis_file, "wb") as file: pickle.dump(analysis, file, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as db:
+            db.execute("UPDATE entries SET bytes = ?, last_used = ? WHERE key = ?",
+                       (os.path.getsize(df_file) + os.path.getsize(analysis_file), time.time(), key))
+
+    def clear(self):
+        """Deletes every entry"""
+
+        with self._connect() as db: keys = [key for key, in db.execute("SELECT key FROM entries")]
+        self._remove(keys)
+
+
+@profiling.profiled()
+def load_chat(path: str, cache: ChatCache = None, dt_format: str = None, progress=None):
+    """Parsed dataframe and analysis of a chat export, from the cache when it has them
+
+    When the cache has an earlier export that the file only appends to, just the new messages are parsed and analyzed.
+    progress is called with a stage ("parsing" or "analyzing") and the fraction of it done.
+    """
+
+    parsing = (lambda fraction: progress("parsing", fraction)) if progress else None
+    if cache is not None and (cached := cache.load(path, dt_format)) is not None: return cached
+
+    if cache is not None and (prefix := cache.load_prefix(path, dt_format)) is not None:
+        df, analysis, offset = prefix
+        tail = parse_chat(path, df.attrs.get("dt_format") or dt_format, offset=offset, progress=parsing)
+        if progress: progress("analyzing", 0.0)
+        analysis.extend(tail)
+        df = concat_chats([df, tail])
+    else:
+        df = parse_chat(path, dt_format, progress=parsing)
+        if progress: progress("analyzing", 0.0)
+        analysis = ChatAnalysis(df)
+    if progress: progress("analyzing", 1.0)
+    if cache is not None: cache.store(path, df, analysis, dt_format)
+    return df, analysis
+
+
+@profiling.profiled()
+def load_chats(paths: list[str], cache: ChatCache = None, dt_format: str = None, progress=None, workers: int = None):
+    """Merged dataframe and analysis of one chat split across several exports, such as yearly backups
+
+    The merged chat is cached under the fingerprints of all the exports, whatever order they come in. Otherwise the
+    exports the cache has on their own are read from it and the others are parsed concurrently. Overlapping messages
+    are kept once.
+    """
+
+    if len(paths) == 1: return load_chat(paths[0], cache, dt_format, progress)
+    if cache is not None and (cached := cache.load(paths, dt_format)) is not None: return cached
+    frames = {}
+    if cache is not None:
+        for path in paths:
+            if (cached := cache.load(path, dt_format)) is not None: frames[path] = cached[0]
+    missing = [path for path in paths if path not in frames]
+    parsing = (lambda fraction: progress("parsing", (len(frames) + fraction * len(missing)) / len(paths))) if progress else None
+    if missing: frames.update(zip(missing, parse_chats(missing, dt_format, workers, parsing)))
+    if progress: progress("analyzing", 0.0)
+    df = merge_chats([frames[path] for path in paths])
+    analysis = ChatAnalysis(df)
+    if progress: progress("analyzing", 1.0)
+    if cache is not None: cache.store(paths, df, analysis, dt_format)
+    return df, analysis
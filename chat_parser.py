@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Streaming parser for WhatsApp chat exports"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import re
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from dateformats import detect_format, timestamp_strings
+import profiling
+
+PARSER_VERSION = "5" # bump whenever the parsed dataframe changes, cached chats are invalidated by it
+CHUNK_SIZE = 1 << 20 # characters read from the export at a time
+# message headers of every locale: "12/31/20, 9:15 PM - ", "31.12.20, 21:15 - ", "[2020-12-31, 21:15:03] "
+DATE = r"\d{1,4}[./-]\d{1,2}[./-]\d{1,4}"
+TIME = r"\d{1,2}[:.]\d{2}(?:[:.]\d{2})?"
+MERIDIEM = r"[AaPp]\.?\s?[Mm]\.?"
+HEADER = rf"\u200e?\[?{DATE},? {TIME}(?:\s{MERIDIEM})?(?:\] | - )"
+# groups: date, time, meridiem (empty for 24 hour times), sender (empty for system events), message with its continuation lines
+PATTERN = re.compile(
+    rf"^\u200e?\[?({DATE}),? ({TIME})(?:\s({MERIDIEM}))?(?:\] | - )(?:(.*?): )?(.*(?:\n(?!{HEADER}|\n*\Z).*)*)",
+    re.MULTILINE)
+HEADER_PATTERN = re.compile(HEADER)
+MEDIA_PATTERN = r"‎?(?:<Media omitted>|<attached: .*>|(?:image|video|audio|sticker|GIF|document) omitted)$"
+# "Missed voice call", "Missed group video call" and iOS's "Voice call, 12 min" or "Missed voice call, Tap to call back"
+CALL_PATTERN = (r"(?i)‎?(?:missed )?(?:group )?(?:voice|video) call"
+                r"(?:,\s*‎?(?:\d+ (?:sec|min|hr)s?|\d{1,2}(?::\d{2}){1,2}|no answer|(?:tap|click) to call back))?$")
+KINDS = ["text", "media", "call", "system"]
+COLUMNS = ["timestamp", "user", "message", "kind"]
+
+try:
+    import pyarrow # pylint: disable=unused-import
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+
+def iter_chunks(file, chunk_size: int = CHUNK_SIZE):
+    """Yields blocks of whole messages read from an open text file"""
+
+    tail = ""
+    while chunk := file.read(chunk_size):
+        chunk = tail + chunk
+        # cut before the last message header so its continuation lines end up in the next block
+        cut = chunk.rfind("\n") + 1
+        while cut > 0 and not HEADER_PATTERN.match(chunk, cut): cut = chunk.rfind("\n", 0, cut - 1) + 1
+        chunk, tail = chunk[:cut], chunk[cut:]
+        if chunk: yield chunk
+    if tail: yield tail
+
+
+def message_kinds(senders: pd.Series, messages: pd.Series):
+    """Tags each message as text, media, call or system"""
+
+    # media and call placeholders are short, so only the short messages need the regexes
+    short = messages[messages.str.len() < 64]
+    media = messages.index.isin(short.index[short.str.match(MEDIA_PATTERN)])
+    call = messages.index.isin(short.index[short.str.match(CALL_PATTERN)])
+    kinds = np.select([(senders == "").to_numpy(), media, call], ["system", "media", "call"], "text")
+    return pd.Categorical(kinds, categories=KINDS)
+
+
+@profiling.profiled()
+def parse_chat(path: str, dt_format: str = None, chunk_size: int = CHUNK_SIZE, offset: int = 0, progress=None):
+    """Parses a chat export chunk by chunk into a timestamp/user/message/kind dataframe
+
+    offset is a byte position to start reading from, such as the size of an earlier export of the same chat.
+    progress is called with the fraction of the file read after every chunk.
+    The datetime format used ends up in df.attrs["dt_format"].
+    """
+
+    matches = []
+    size = max(os.path.getsize(path) - offset, 1)
+    with profiling.span("parse_chat.regex") as event, open(path, "r", encoding="utf-8") as file:
+        file.seek(offset)
+        for chunk in iter_chunks(file, chunk_size):
+            matches.extend(PATTERN.findall(chunk))
+            if progress: progress(min((file.buffer.tell() - offset) / size, 1.0))
+        event["rows"] = len(matches)
+
+    if not matches:
+        df = pd.DataFrame(columns=COLUMNS)
+        df.attrs["dt_format"] = dt_format
+        return df
+    # transpose the matches into date, time, meridiem, sender and message columns
+    rows = len(matches)
+    with profiling.span("parse_chat.columns", rows):
+        dates, times, meridiems, senders, messages = (pd.Series(column, dtype=object) for column in zip(*matches))
+        del matches
+    with profiling.span("parse_chat.datetime", rows):
+        stamps = timestamp_strings(dates, times, meridiems)
+        if dt_format is None:
+            dt_format = detect_format(dates, times, meridiems)
+            # a sample can miss the one date that rules its format out, the whole chat can't
+            try: timestamps = pd.to_datetime(stamps, format=dt_format)
+            except ValueError:
+                dt_format = detect_format(dates, times, meridiems, sample_size=None)
+                timestamps = pd.to_datetime(stamps, format=dt_format)
+        else: timestamps = pd.to_datetime(stamps, format=dt_format)
+    with profiling.span("parse_chat.kinds", rows):
+        kinds = message_kinds(senders, messages)
+        # media and call placeholders carry no words of their own
+        messages = messages.mask(kinds.isin(["media", "call"]), "")
+
+    with profiling.span("parse_chat.frame", rows):
+        df = pd.DataFrame({
+            "timestamp": timestamps,
+            "user": pd.Categorical(senders.mask(kinds == "system")),
+            "message": messages.astype(STRING_DTYPE),
+            "kind": kinds,
+        })
+    df.attrs["dt_format"] = dt_format
+    return df
+
+
+def concat_chats(frames: list[pd.DataFrame]):
+    """Concatenates parsed chats, keeping the categorical and string dtypes"""
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames: return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    # categories differ between frames, so pd.concat alone falls back to object columns
+    df["user"] = union_categoricals([frame["user"].astype("category") for frame in frames])
+    df["kind"] = pd.Categorical(df["kind"], categories=KINDS)
+    df["message"] = df["message"].astype(STRING_DTYPE)
+    df.attrs["dt_format"] = frames[0].attrs.get("dt_format")
+    return df
+
+
+def parse_chats(paths: list[str], dt_format: str = None, workers: int = None, progress=None):
+    """Parses several exports concurrently in worker processes, the dataframes come back in the order of paths
+
+    Each export detects its own datetime format unless one is given, so exports from devices in other locales mix.
+    progress is called with the fraction of exports parsed.
+    """
+
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        frames = []
+        for path in paths:
+            frames.append(parse_chat(path, dt_format))
+            if progress: progress(len(frames) / len(paths))
+        return frames
+    frames = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # the largest exports start first, so the pool finishes about when the largest one is parsed
+        futures = {executor.submit(parse_chat, path, dt_format): path for path in sorted(paths, key=os.path.getsize, reverse=True)}
+        for future in as_completed(futures):
+            frames[futures[future]] = future.result()
+            if progress: progress(len(frames) / len(paths))
+    return [frames[path] for path in paths]
+
+
+@profiling.profiled()
+def merge_chats(frames: list[pd.DataFrame]):
+    """Merges exports of the same chat in time order, dropping the messages overlapping exports have in common
+
+    Messages are matched by a hash of their timestamp, user and text. A message repeated within one export is kept
+    as many times as the export that repeats it most has it.
+    """
+
+    frames = [frame for frame in frames if not frame.empty]
+    if len(frames) <= 1: return concat_chats(frames)
+    # exports are merged oldest first, so messages sent in the same minute come out in the same order whatever order
+    # the exports were picked in
+    spans, frames = zip(*sorted((((frame["timestamp"].min(), frame["timestamp"].max()), frame) for frame in frames),
+                                key=lambda item: item[0]))
+    keys, offset = [], 0
+    for i, frame in enumerate(frames):
+        # only messages sent while another export was also recording can be in both, the rest aren't hashed
+        overlap = np.logical_or.reduce([frame["timestamp"].between(*span).to_numpy() for j, span in enumerate(spans) if j != i])
+        hashes = pd.util.hash_pandas_object(frame.loc[overlap, ["timestamp", "user", "message"]], index=False).to_numpy()
+        keys.append(pd.DataFrame({"hash": hashes, "repeat": pd.Series(hashes).groupby(hashes).cumcount().to_numpy(),
+                                  "row": np.flatnonzero(overlap) + offset}))
+        offset += len(frame)
+    df = concat_chats(frames)
+    keys = pd.concat(keys, ignore_index=True)
+    # copies share a timestamp, so the first one in export order is also the first one once merged
+    unique = np.ones(len(df), dtype=bool)
+    unique[keys.loc[keys.duplicated(["hash", "repeat"]), "row"].to_numpy()] = False
+    # a stable sort of the concatenated exports merges their runs of ordered timestamps, ties keep the older export first
+    order = np.argsort(df["timestamp"].to_numpy(), kind="stable")
+    return df.iloc[order[unique[order]]].reset_index(drop=True)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Detection of the datetime format of a chat export from a sample of its message headers"""
+
+import re
+import numpy as np
+import pandas as pd
+import profiling
+
+SAMPLE_SIZE = 4096 # headers looked at, spread evenly over the chat
+ORDERS = ["dmy", "mdy", "ymd"] # orders of the date fields WhatsApp exports use across locales
+DIRECTIVES = {"d": "%d", "m": "%m", "y": "%y"}
+
+
+def normalize_meridiems(meridiems: pd.Series):
+    """AM/PM markers such as "p. m." or "pm" as "AM" and "PM", empty for 24 hour times"""
+
+    unique = meridiems.unique()
+    return meridiems.map({meridiem: re.sub(r"[\s.]", "", meridiem).upper() for meridiem in unique})
+
+
+def timestamp_strings(dates: pd.Series, times: pd.Series, meridiems: pd.Series):
+    """Date, time and AM/PM marker joined into the strings a detected format applies to"""
+
+    stamps = dates + " " + times
+    if (meridiems != "").any(): stamps = stamps + " " + normalize_meridiems(meridiems)
+    return stamps
+
+
+def sample(series: pd.Series, size: int = SAMPLE_SIZE):
+    """Evenly spaced values of a series in their original order, the first and last one included"""
+
+    if size is None or len(series) <= size: return series.reset_index(drop=True)
+    return series.iloc[np.unique(np.linspace(0, len(series) - 1, size).astype(int))].reset_index(drop=True)
+
+
+def date_format(order: str, fields: pd.DataFrame):
+    """strftime format of the dates for an order of fields, or None when the values rule it out"""
+
+    values = fields.astype(int)
+    widths = fields.apply(lambda column: column.str.len())
+    directives = []
+    for i, field in enumerate(order):
+        width = widths[i].max()
+        if field == "y":
+            if widths[i].min() not in (2, 4) or widths[i].nunique() > 1: return None
+            directives.append("%Y" if width == 4 else "%y")
+            continue
+        # a value above 12 can't be a month and one above 31 can't be a day
+        high = 12 if field == "m" else 31
+        if width > 2 or not values[i].between(1, high).all(): return None
+        directives.append(DIRECTIVES[field])
+    # a four digit first field is a year, and years only come first when they are written out in full
+    if (widths[0] == 4).any() != (order[0] == "y"): return None
+    return directives
+
+
+def time_format(times: pd.Series, twelve_hour: bool):
+    """strftime format of the times, with or without seconds and in 12 or 24 hour notation"""
+
+    separator = "." if times.iloc[0][-3] == "." else ":"
+    seconds = times.str.count(re.escape(separator)).max() == 2
+    hours = times.str.split(re.escape(separator), n=1).str[0].astype(int)
+    if twelve_hour and not hours.between(1, 12).all(): raise ValueError("AM/PM times with hours outside 1 to 12")
+    hour = "%I" if twelve_hour else "%H"
+    return separator.join([hour, "%M"] + (["%S"] if seconds else [])) + (" %p" if twelve_hour else "")
+
+
+def backward_steps(stamps: pd.Series, dt_format: str):
+    """How often consecutive messages go back in time under a format, chats being chronological"""
+
+    timestamps = pd.to_datetime(stamps, format=dt_format, errors="coerce")
+    if timestamps.isna().any(): return len(stamps)
+    return int((timestamps.diff() < pd.Timedelta(0)).sum())
+
+
+@profiling.profiled()
+def detect_format(dates: pd.Series, times: pd.Series, meridiems: pd.Series, sample_size: int = SAMPLE_SIZE):
+    """Datetime format of the strings timestamp_strings builds, detected from a bounded sample
+
+    Orders of the date fields are ruled out by value ranges first, then by how often time would run backwards.
+    Raises ValueError when the sample fits no format or fits several that would give different timestamps.
+    """
+
+    dates, times, meridiems = sample(dates, sample_size), sample(times, sample_size), sample(meridiems, sample_size)
+    if dates.empty: raise ValueError("no dates to detect a datetime format from")
+    separator = re.search(r"[./-]", dates.iloc[0]).group()
+    fields = dates.str.split(re.escape(separator), expand=True)
+    if fields.shape[1] != 3 or fields.isna().any(axis=None): raise ValueError("dates don't have three fields")
+
+    clock = time_format(times, (meridiems != "").any())
+    candidates = {}
+    for order in ORDERS:
+        directives = date_format(order, fields)
+        if directives: candidates[order] = separator.join(directives) + " " + clock
+    if not candidates: raise ValueError(f"unknown datetime format of dates such as {dates.iloc[0]!r}")
+    if len(candidates) == 1: return next(iter(candidates.values()))
+
+    stamps = timestamp_strings(dates, times, meridiems)
+    steps = {order: backward_steps(stamps, dt_format) for order, dt_format in candidates.items()}
+    fewest = min(steps.values())
+    best = [candidates[order] for order in candidates if steps[order] == fewest]
+    # formats that read every sampled date the same way can't be told apart, and don't need to be
+    parsed = {pd.to_datetime(stamps, format=dt_format, errors="coerce").to_numpy().tobytes() for dt_format in best}
+    if len(parsed) > 1: raise ValueError(f"ambiguous datetime format, could be any of {', '.join(best)}")
+    return best[0]
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Cancellable background jobs for the UI"""
+
+import threading
+import traceback
+
+
+class Cancelled(Exception):
+    """Raised inside a job once it has been cancelled"""
+
+
+class Job:
+    """Runs target(job, *args) on a daemon thread, target calls job.check() between steps to stop when cancelled"""
+
+    def __init__(self, target, *args, on_error=None):
+
+        self.target = target
+        self.args = args
+        self.on_error = on_error
+        self._cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        """Runs the target, swallowing cancellation and handing errors to on_error"""
+
+        try: self.target(self, *self.args)
+        except Cancelled: pass
+        except Exception as error: # pylint: disable=broad-except
+            if self.cancelled: return
+            if self.on_error: self.on_error(error)
+            else: traceback.print_exc()
+
+    def start(self):
+        """Starts the job and returns it"""
+
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """Asks the job to stop at its next check"""
+
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        """Whether the job was cancelled"""
+
+        return self._cancelled.is_set()
+
+    def check(self):
+        """Raises Cancelled if the job was cancelled"""
+
+        if self.cancelled: raise Cancelled()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Opt-in timing of pipeline stages, exported as a report or a Chrome trace"""
+
+from contextlib import contextmanager, nullcontext
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+ENV_VAR = "CHAT_ANALYZER_PROFILE" # set to 1 (or "memory" to also trace allocations) to profile from the start
+_NO_SPAN = nullcontext({}) # yields a throwaway event, so callers can set rows without checking
+_enabled = False
+_memory = False
+_events = []
+_lock = threading.Lock()
+
+
+def enable(memory: bool = False):
+    """Starts recording spans, with memory deltas from tracemalloc when memory is set (much slower)"""
+
+    global _enabled, _memory # pylint: disable=global-statement
+    _enabled, _memory = True, memory
+    if memory and not tracemalloc.is_tracing(): tracemalloc.start()
+
+
+def disable():
+    """Stops recording spans, the ones recorded so far are kept"""
+
+    global _enabled, _memory # pylint: disable=global-statement
+    if _memory and tracemalloc.is_tracing(): tracemalloc.stop()
+    _enabled = _memory = False
+
+
+def enabled():
+    """Whether spans are being recorded"""
+
+    return _enabled
+
+
+@contextmanager
+def _span(name: str, rows: int):
+
+    memory = tracemalloc.get_traced_memory()[0] if _memory else None
+    start = time.perf_counter_ns()
+    event = {"name": name, "start": start, "pid": os.getpid(), "tid": threading.get_ident(), "rows": rows}
+    try: yield event
+    finally:
+        event["duration"] = time.perf_counter_ns() - start
+        if memory is not None: event["memory"] = tracemalloc.get_traced_memory()[0] - memory
+        with _lock: _events.append(event)
+
+
+def span(name: str, rows: int = None):
+    """Context manager timing a block, the event it yields can take a row count once it is known
+
+    Does nothing while profiling is off, so it can stay around hot code.
+    """
+
+    return _span(name, rows) if _enabled else _NO_SPAN
+
+
+def profiled(name: str = None):
+    """Decorator timing every call of a function as a span"""
+
+    def decorator(func):
+        label = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled: return func(*args, **kwargs)
+            with _span(label, None): return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def events():
+    """Recorded spans, oldest first"""
+
+    with _lock: return list(_events)
+
+
+def drain():
+    """Recorded spans, which are then forgotten, to hand them from a worker process to the main one"""
+
+    with _lock:
+        drained = list(_events)
+        _events.clear()
+    return drained
+
+
+def merge(spans: list[dict]):
+    """Adds spans recorded elsewhere, such as in a worker process"""
+
+    with _lock: _events.extend(spans)
+
+
+def clear():
+    """Forgets every recorded span"""
+
+    with _lock: _events.clear()
+
+
+def report():
+    """Calls, time, rows and memory of every span name, slowest total first"""
+
+    stats = {}
+    for event in events():
+        stat = stats.setdefault(event["name"], {"calls": 0, "seconds": 0.0, "max_ms": 0.0, "rows": 0, "memory_mb": 0.0})
+        stat["calls"] += 1
+        stat["seconds"] += event["duration"] / 1e9
+        stat["max_ms"] = max(stat["max_ms"], event["duration"] / 1e6)
+        stat["rows"] += event["rows"] or 0
+        stat["memory_mb"] += event.get("memory", 0) / 2**20
+    for stat in stats.values(): stat["mean_ms"] = stat["seconds"] * 1e3 / stat["calls"]
+    return dict(sorted(stats.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+
+def format_report():
+    """The report as a text table"""
+
+    lines = [f"{'span':<32} {'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'rows':>10} {'mem MB':>8}"]
+    for name, stat in report().items():
+        lines.append(f"{name:<32} {stat['calls']:>7} {stat['seconds']:>9.3f} {stat['mean_ms']:>9.2f} {stat['max_ms']:>9.2f}"
+                     f" {stat['rows']:>10} {stat['memory_mb']:>8.1f}")
+    return "\n".join(lines)
+
+
+def chrome_trace():
+    """Spans in the Chrome trace event format, for chrome://tracing or Perfetto"""
+
+    trace = []
+    for event in events():
+        args = {key: event[key] for key in ["rows", "memory"] if event.get(key) is not None}
+        trace.append({"name": event["name"], "ph": "X", "ts": event["start"] / 1e3, "dur": event["duration"] / 1e3,
+                      "pid": event["pid"], "tid": event["tid"], "args": args})
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def export(path: str):
+    """Writes the spans to a file, a Chrome trace for *.trace.json, a JSON report for other *.json and a text table otherwise"""
+
+    with open(path, "w", encoding="utf-8") as file:
+        if path.endswith(".trace.json"): json.dump(chrome_trace(), file)
+        elif path.endswith(".json"): json.dump(report(), file, indent=2)
+        else: file.write(format_report() + "\n")
+
+
+if os.environ.get(ENV_VAR, "") not in ("", "0"): enable(memory=os.environ[ENV_VAR] == "memory")
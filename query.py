@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Indexed stats of a chat for any date range and set of users"""
+
+from collections import Counter
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import profiling
+from sentiment import BATCH_SIZE, SentimentBackend, default_backend
+from textproc import emoji_positions, emojis, word_positions, words
+from timebuckets import DAY_NS, EPOCH_WEEKDAY, HOUR_NS, HOURS, WEEKDAYS, bucket_labels
+
+MONTH_OFFSET = 1970 * 12 # timebuckets month codes count from year 0, numpy months from 1970
+
+
+def month_codes(days: np.ndarray):
+    """timebuckets month code of days given as days since the epoch"""
+
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) + MONTH_OFFSET
+
+
+def month_start(codes: np.ndarray):
+    """First day of months given as timebuckets month codes, in days since the epoch"""
+
+    return (np.asarray(codes) - MONTH_OFFSET).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+
+
+def monthly_counters(tokens: np.ndarray, starts: np.ndarray, message_starts: np.ndarray, message_months: np.ndarray):
+    """Counters of tokens by the month of the message they were found in, given where tokens and messages start"""
+
+    if not len(tokens): return {}
+    token_months = message_months[np.searchsorted(message_starts, starts, side="right") - 1]
+    # messages are in time order, so every month is one run of tokens
+    edges = np.concatenate([[0], np.flatnonzero(np.diff(token_months)) + 1, [len(tokens)]])
+    return {int(token_months[lo]): Counter(tokens[lo:hi].tolist()) for lo, hi in zip(edges[:-1], edges[1:])}
+
+
+def to_day(value):
+    """Day since the epoch of anything pd.Timestamp takes"""
+
+    return pd.Timestamp(value).value // DAY_NS
+
+
+class ChatIndex:
+    """Sorted indexes over a parsed chat, answering stats for date ranges and user subsets without rescanning it
+
+    Activity comes from per-user prefix sums over the days they were active, words and emojis from per-user
+    monthly Counters, and sentiment from per-user prefix sums over their messages, built on the first query for it.
+    scores are message sentiments already known, such as ChatAnalysis.scores, in the order of the rows with a user,
+    NaN where unscored. check is called between steps of the build, and can raise to stop one that is no longer needed.
+    """
+
+    @profiling.profiled()
+    def __init__(self, df: pd.DataFrame, sentiment: SentimentBackend = default_backend, check=None, scores: np.ndarray = None):
+
+        check = check or (lambda: None)
+        df = df.loc[df["user"].notna()]
+        order = np.argsort(df["timestamp"].to_numpy(), kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+        self.sentiment = sentiment
+        self._scores = np.full(len(df), np.nan) if scores is None else np.asarray(scores, dtype=float)[order]
+        self.messages = df["message"].astype(object).to_numpy()
+        ns = df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        users = df["user"].astype(object)
+        self.users = list(users.unique())
+        codes = pd.Categorical(users, categories=self.users).codes.astype(np.int64)
+        days = ns // DAY_NS
+        months = month_codes(days)
+        self.first_day, self.last_day = (int(days.min()), int(days.max())) if len(days) else (0, -1)
+
+        # positions of every user's messages in time order, grouped by a stable sort on the user
+        grouped = np.argsort(codes, kind="stable")
+        self.positions = dict(zip(self.users, np.split(grouped, np.cumsum(np.bincount(codes, minlength=len(self.users)))[:-1])))
+        self.timestamps = {user: ns[positions] for user, positions in self.positions.items()}
+        self.days, self._activity = {}, {}
+        for user, positions in self.positions.items():
+            check()
+            user_days, day_index = np.unique(days[positions], return_inverse=True)
+            hours = np.bincount(day_index * 24 + ns[positions] // HOUR_NS % 24, minlength=len(user_days) * 24).reshape(-1, 24)
+            weekdays = np.zeros((len(user_days), 7), dtype=np.int64)
+            weekdays[np.arange(len(user_days)), (user_days + EPOCH_WEEKDAY) % 7] = hours.sum(axis=1)
+            # row i holds the totals of the user's first i active days: 24 hours, then 7 weekdays
+            activity = np.zeros((len(user_days) + 1, 31), dtype=np.int64)
+            np.cumsum(np.hstack([hours, weekdays]), axis=0, out=activity[1:])
+            self.days[user], self._activity[user] = user_days, activity
+
+        # every user's messages are scanned once, and the tokens split by month on where they were found
+        self.word_freq, self.emoji_freq = {}, {}
+        for user, positions in self.positions.items():
+            check()
+            messages = self.messages[positions].tolist()
+            lowered = [message.lower() for message in messages]
+            for freq, texts, tokens in [(self.word_freq, lowered, word_positions), (self.emoji_freq, messages, emoji_positions)]:
+                message_starts = np.concatenate([[0], np.cumsum([len(text) + 1 for text in texts])[:-1]]).astype(np.int64)
+                freq[user] = monthly_counters(*tokens("\n".join(texts)), message_starts, months[positions])
+        self._sentiment_sums = None
+
+    def _day_range(self, start, end):
+        """First and last day of a range, the whole chat by default, last is first - 1 when it misses the chat"""
+
+        if start is not None and end is not None and to_day(start) > to_day(end):
+            raise ValueError(f"range starts after it ends: {start} > {end}")
+        first = self.first_day if start is None else max(to_day(start), self.first_day)
+        last = self.last_day if end is None else min(to_day(end), self.last_day)
+        return first, max(last, first - 1)
+
+    def _message_range(self, user: str, first: int, last: int):
+        """Slice of a user's messages sent between two days, both included"""
+
+        lo, hi = np.searchsorted(self.timestamps[user], [first * DAY_NS, (last + 1) * DAY_NS])
+        return slice(lo, hi)
+
+    def _counters(self, user: str, freq: dict, tokens, first: int, last: int):
+        """Tokens a user sent between two days, merging whole months and scanning only the partial ones at the edges"""
+
+        counter = Counter()
+        first_month, last_month = month_codes(np.array([first, last]))
+        for month in range(first_month, last_month + 1):
+            if month not in freq[user]: continue
+            start, end = month_start([month, month + 1])
+            if start >= first and end - 1 <= last: counter.update(freq[user][month])
+            else:
+                span = self._message_range(user, max(start, first), min(end - 1, last))
+                counter.update(tokens("\n".join(self.messages[self.positions[user][span]])))
+        return counter
+
+    def sentiment_sums(self, check=None):
+        """Running sentiment sums over every user's messages, scored once for the whole chat
+
+        check is called between batches of messages, and can raise to stop scoring.
+        """
+
+        if self._sentiment_sums is None:
+            # only the messages without a known score are scored
+            scores = self._scores.copy()
+            missing = np.flatnonzero(np.isnan(scores))
+            for start in range(0, len(missing), BATCH_SIZE):
+                if check: check()
+                batch = missing[start:start + BATCH_SIZE]
+                scores[batch] = self.sentiment.polarity(self.messages[batch].tolist())
+            self._sentiment_sums = {user: np.concatenate([[0.0], np.cumsum(scores[positions])])
+                                    for user, positions in self.positions.items()}
+        return self._sentiment_sums
+
+    @profiling.profiled()
+    def query(self, start=None, end=None, users: list[str] = None):
+        """Stats of some users (all by default) between two days, both included
+
+        Raises ValueError when start is after end.
+        """
+
+        return RangeStats(self, *self._day_range(start, end), self.users if users is None else list(users))
+
+
+class RangeStats:
+    """Stats of a date range, laid out like ChatAnalysis: users, summary, buckets.counts and buckets.labels"""
+
+    def __init__(self, index: ChatIndex, first: int, last: int, users: list[str]):
+
+        self.index = index
+        self.users = users
+        self.first, self.last = first, last
+        self.start, self.end = pd.Timestamp(first * DAY_NS), pd.Timestamp(last * DAY_NS)
+        num_days = max(last - first + 1, 0)
+        first_month, last_month = month_codes(np.array([first, last])) if num_days else (0, -1)
+        # edges of every day and month in the range, in days since the epoch
+        day_edges = np.arange(first, first + num_days + 1)
+        month_edges = np.concatenate([[first], month_start(np.arange(first_month + 1, last_month + 1)), [last + 1]]) if num_days else [first]
+
+        counts = {"hour": [], "weekday": [], "day": [], "month": []}
+        for user in users:
+            activity, user_days = index._activity[user], index.days[user] # pylint: disable=protected-access
+            totals = activity[:, :24].sum(axis=1)
+            lo, hi = np.searchsorted(user_days, [first, last + 1])
+            counts["hour"].append(activity[hi, :24] - activity[lo, :24])
+            counts["weekday"].append(activity[hi, 24:] - activity[lo, 24:])
+            counts["day"].append(np.diff(totals[np.searchsorted(user_days, day_edges)]))
+            counts["month"].append(np.diff(totals[np.searchsorted(user_days, month_edges)]))
+        # widths are explicit so an empty set of users still gets a matrix of the right shape
+        widths = {"hour": 24, "weekday": 7, "day": num_days, "month": len(month_edges) - 1}
+        self.buckets = SimpleNamespace(
+            counts={resolution: np.array(rows, dtype=np.int64).reshape(len(users), widths[resolution])
+                    for resolution, rows in counts.items()},
+            labels={"hour": HOURS, "weekday": WEEKDAYS, "day": bucket_labels("day", first, last) if num_days else [],
+                    "month": bucket_labels("month", first_month, last_month) if num_days else []})
+
+        # pylint: disable=protected-access
+        self.word_freq = {user: index._counters(user, index.word_freq, words, first, last) for user in users}
+        self.emoji_freq = {user: index._counters(user, index.emoji_freq, emojis, first, last) for user in users}
+        self.summary = pd.DataFrame({
+            "num_messages": self.buckets.counts["hour"].sum(axis=1),
+            "num_words": [sum(self.word_freq[user].values()) for user in users],
+            "num_emojis": [sum(self.emoji_freq[user].values()) for user in users],
+        }, index=pd.Index(users, dtype=object))
+
+    def sentiment_polarity(self, username: str):
+        """Average message sentiment of a user in the range, NaN without messages"""
+
+        sums = self.index.sentiment_sums()[username]
+        span = self.index._message_range(username, self.first, self.last) # pylint: disable=protected-access
+        count = span.stop - span.start
+        return (sums[span.stop] - sums[span.start]) / count if count else float("nan")
+
+    def top_swear(self, username: str):
+        """Most negative word a user sent in the range or None"""
+
+        candidates = list(self.word_freq[username])
+        if not candidates: return None
+        scores = np.array(self.index.sentiment.polarity(candidates), dtype=float)
+        return candidates[scores.argmin()] if scores.min() < 0 else None
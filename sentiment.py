@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Batched, cached sentiment scoring"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import threading
+
+CACHE_SIZE = 1 << 17 # distinct texts kept across calls
+BATCH_SIZE = 4096 # texts sent to a worker process at a time
+
+
+def textblob_polarity(text: str):
+    """TextBlob sentiment polarity of a text"""
+
+    # TextBlob pulls in nltk, so it is only imported once there is something to score
+    from textblob import TextBlob # pylint: disable=import-outside-toplevel
+    return TextBlob(text).sentiment.polarity
+
+
+def warm_up():
+    """Imports TextBlob and loads its lexicon ahead of the first text to score, such as on a background thread"""
+
+    textblob_polarity("warm up")
+
+
+def score_batch(scorer, texts: list[str]):
+    """Scores a batch of texts, run inside worker processes"""
+
+    return [scorer(text) for text in texts]
+
+
+class SentimentBackend:
+    """Scores each distinct text once through a bounded LRU cache, optionally across worker processes"""
+
+    def __init__(self, scorer=textblob_polarity, cache_size: int = CACHE_SIZE, workers: int = 1):
+
+        self.scorer = scorer # must be a picklable module-level function when workers > 1
+        self.cache_size = cache_size
+        self.workers = workers
+        self._cache = OrderedDict()
+        # the cache is shared by every thread scoring with this backend, texts are scored outside of the lock
+        self._lock = threading.Lock()
+
+    def _score_missing(self, texts: list[str]):
+        """Scores texts that are not cached yet"""
+
+        if self.workers <= 1 or len(texts) <= BATCH_SIZE: return score_batch(self.scorer, texts)
+        batches = [texts[i:i+BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return [score for scores in executor.map(score_batch, [self.scorer]*len(batches), batches) for score in scores]
+
+    def polarity(self, texts: list[str]):
+        """Polarity of every text, in the same order"""
+
+        scores = dict.fromkeys(texts)
+        missing = []
+        with self._lock:
+            for text in scores:
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    scores[text] = self._cache[text]
+                else: missing.append(text)
+
+        missing_scores = self._score_missing(missing)
+        with self._lock:
+            for text, score in zip(missing, missing_scores):
+                scores[text] = self._cache[text] = score
+            while len(self._cache) > self.cache_size: self._cache.popitem(last=False)
+
+        return [scores[text] for text in texts]
+
+    def clear(self):
+        """Empties the cache"""
+
+        with self._lock: self._cache.clear()
+
+
+default_backend = SentimentBackend()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Word and emoji extraction over the message column"""
+
+import re
+import emoji
+import numpy as np
+import pandas as pd
+
+PUNCTUATIONS = r".,!\?;:()[]{}"
+ENG_COMMON_WORDS = frozenset([
+    #Articles
+    'a', 'an', 'the',
+    #Conjunctions
+    'for', 'and', 'nor', 'but', 'or', 'yet', 'so',
+    #Pronouns
+    'i', 'me', 'my', 'mine', 'myself', 'you', 'your', 'yours', 'yourself',
+    'he', 'him', 'his', 'himself', 'she', 'her', 'hers', 'herself', 'it',
+    'its', 'itself', 'we', 'us', 'our', 'ours', 'ourselves', 'yourselves',
+    'they', 'them', 'their', 'theirs', 'themselves', 'that',
+    #Prepositions
+    'above', 'across', 'against', 'along', 'among', 'around', 'at', 'before',
+    'behind', 'below', 'beneath', 'beside', 'between', 'by', 'down', 'from',
+    'in', 'into', 'near', 'of', 'off', 'on', 'to', 'toward', 'under', 'upon',
+    'with', 'within'
+])
+
+# a whitespace separated chunk that is letters once the punctuation around it is stripped
+WORD_PATTERN = re.compile(r"(?<!\S)[{0}]*([^\W\d_]+)[{0}]*(?!\S)".format(re.escape(PUNCTUATIONS)))
+REGIONAL_INDICATORS = "\U0001F1E6-\U0001F1FF"
+SKIN_TONES = "\U0001F3FB-\U0001F3FF"
+
+
+def char_class(chars: set[str]):
+    """Regex character class body with runs of consecutive code points collapsed into ranges"""
+
+    ranges = []
+    for code in sorted(map(ord, chars)):
+        if ranges and code == ranges[-1][1] + 1: ranges[-1][1] = code
+        else: ranges.append([code, code])
+    # a few ranges are much faster to test than a thousand astral code points
+    return "".join(re.escape(chr(start)) + (f"-{re.escape(chr(end))}" if end > start else "") for start, end in ranges)
+
+
+# characters an emoji can start with, keycap digits and flag letters are matched on their own
+EMOJI_BASES = char_class({key[0] for key in emoji.EMOJI_DATA if not key[0].isascii()
+                          and not "\U0001F1E6" <= key[0] <= "\U0001F1FF"})
+EMOJI_UNIT = (rf"(?:[{REGIONAL_INDICATORS}]{{2}}|[0-9#*]\ufe0f?\u20e3"
+              rf"|[{EMOJI_BASES}]\ufe0f?[{SKIN_TONES}]?[\U000E0020-\U000E007F]*)")
+# flags, keycaps, skin tones and ZWJ sequences such as 👩‍👩‍👧 all come out as one emoji. The first character
+# is matched with a cheap class (not ASCII, or a keycap digit) and only then checked against the emoji bases
+EMOJI_PATTERN = re.compile(
+    rf"[^\x00-\x22\x24-\x29\x2b-\x2f\x3a-\x7f](?:(?<=[{REGIONAL_INDICATORS}])[{REGIONAL_INDICATORS}]"
+    rf"|(?<=[0-9#*])\ufe0f?\u20e3|(?<=[{EMOJI_BASES}])\ufe0f?[{SKIN_TONES}]?[\U000E0020-\U000E007F]*)"
+    rf"(?:\u200d{EMOJI_UNIT})*")
+
+
+def is_word(token: str):
+    """Whether a lowercase token counts towards word stats"""
+
+    return token.isalpha() and token not in ENG_COMMON_WORDS
+
+
+def words(text: str):
+    """Lowercase words of a text that are not common English words"""
+
+    tokens = pd.Series(WORD_PATTERN.findall(text.lower()), dtype=object)
+    return tokens[tokens.isin([token for token in tokens.unique() if is_word(token)])].to_numpy()
+
+
+def emojis(text: str):
+    """Emojis of a text in order of appearance"""
+
+    return np.array(EMOJI_PATTERN.findall(text), dtype=object)
+
+
+def word_positions(text: str):
+    """Words of an already lowercase text, as words finds them, and the position each one starts at"""
+
+    found = [(match.group(1), match.start()) for match in WORD_PATTERN.finditer(text)]
+    keep = {token: is_word(token) for token in {token for token, _ in found}}
+    found = [(token, start) for token, start in found if keep[token]]
+    return np.array([token for token, _ in found], dtype=object), np.array([start for _, start in found], dtype=np.int64)
+
+
+def emoji_positions(text: str):
+    """Emojis of a text, as emojis finds them, and the position each one starts at"""
+
+    found = [(match.group(), match.start()) for match in EMOJI_PATTERN.finditer(text)]
+    return np.array([token for token, _ in found], dtype=object), np.array([start for _, start in found], dtype=np.int64)
+
+
+def tokenize(users: pd.Series, messages: pd.Series):
+    """Words and emojis of every user's messages, keyed by user"""
+
+    # each user's messages are scanned as one text so the regexes run once per user
+    texts = messages.groupby(users.to_numpy(), sort=False).agg("\n".join)
+    return {user: words(text) for user, text in texts.items()}, {user: emojis(text) for user, text in texts.items()}
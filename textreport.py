@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Colored text report of a chat's stats for the command line, kept apart from old.py so its prompt shows before pandas loads"""
+# pylint: disable=multiple-statements
+
+from collections import Counter
+from colorama import Fore
+import numpy as np
+import pandas as pd
+from analytics import ChatAnalysis, UserStats
+import profiling
+
+DIVIDER = "="*48
+BAR_CHAR = "█"
+
+
+class User(UserStats):
+    """Class to represent a user"""
+
+    def __init__(self, username: str, analysis: ChatAnalysis, color: str = Fore.RESET):
+
+        super().__init__(username, analysis)
+        self.color = color
+
+    def graph_freq(self, freq: Counter, padding: int = 10, scale: int = 100):
+        """Returns a Unicode bar graph for a given frequency distribution"""
+
+        graph = ""
+        total = sum(freq.values())
+        for element, count in freq.most_common(5):
+            len_bar = int(round(count / total * scale))
+            graph += f"{element:<{padding}} | {self.color}{BAR_CHAR*len_bar}{Fore.RESET} {count}\n"
+        return graph
+
+    @profiling.profiled("User.display")
+    def display(self):
+        """Displays user information"""
+    
+        top_hour = self.hour_freq.most_common(1)[0][0]
+        return f"""
+{self.username.upper()}{self.color}\n{DIVIDER}{Fore.RESET}
+Messages sent: {self.color}{self.num_messages}{Fore.RESET}
+Avg msg length: {self.color}{self.avg_msg_len:.2f} {Fore.RESET}words
+Longest msg: {self.color}{len(self.longest_msg)}{Fore.RESET} chars
+Words sent: {self.color}{self.num_words}{Fore.RESET}
+Emojis sent: {self.color}{self.num_emojis}{Fore.RESET}
+\nTOP WORDS:\n{self.graph_freq(self.word_freq, scale=200)}
+TOP EMOJIS:\n{self.graph_freq(self.emoji_freq, padding=1)}
+Top swear: {self.color}{self.top_swear}{Fore.RESET}
+Left on read coefficient: {self.color}{NotImplemented}{Fore.RESET}
+Most active at: {self.color}{top_hour}{Fore.RESET}
+Avg msg sentiment: {self.color}{self.sentiment_polarity:.3f}{Fore.RESET}
+"""
+
+    def __repr__(self):
+        return self.username
+
+@profiling.profiled()
+def stacked_graph(data: dict[User, np.ndarray], labels: list[str], padding: int = 8, scale: int = 100):
+    """Returns a Unicode bar graph for per-user counts over a fixed order of buckets"""
+
+    graph = ""
+    counts = np.vstack(list(data.values()))
+    lengths = np.rint(counts / max(counts.sum(), 1) * scale).astype(int)
+    for i, element in enumerate(labels):
+        bar = "".join(f"{user.color}{BAR_CHAR*len_bar}{Fore.RESET}" for user, count, len_bar in zip(data, counts[:, i], lengths[:, i]) if count)
+        # only add the bar if it's not empty (it's empty if the length was rounded to 0)
+        if BAR_CHAR in bar: graph += f"{element:<{padding}} | {bar}\n"
+
+    return graph
+
+
+def report(df: pd.DataFrame):
+    """Colored text report of every user and of the whole chat"""
+
+    result = ""
+    colors = [
+        Fore.LIGHTRED_EX, Fore.LIGHTGREEN_EX, Fore.LIGHTYELLOW_EX,
+        Fore.LIGHTBLUE_EX, Fore.LIGHTMAGENTA_EX, Fore.LIGHTCYAN_EX]
+
+    users = list()
+    analysis = ChatAnalysis(df)
+    for i, username in enumerate(analysis.users):
+        color = colors[i % len(colors)]
+        user = User(username, analysis, color)
+        users.append(user)
+        result += user.display()
+
+    total_words = sum(user.num_words for user in users)
+    total_emojis = sum(user.num_emojis for user in users)
+    words_sent, emojis_sent = None, None
+    if total_words: words_sent = "".join([f"{user.color}{BAR_CHAR*int(round((user.num_words/total_words*32)))}{Fore.RESET}" for user in users])
+    if total_emojis: emojis_sent = "".join([f"{user.color}{BAR_CHAR*int(round((user.num_emojis/total_emojis*32)))}{Fore.RESET}" for user in users])
+    buckets = analysis.buckets
+    day_freq = Counter()
+    for user in users: day_freq += user.day_freq
+
+    result += (f"""
+{" vs ".join(f"{user.color}{user.username.upper()}{Fore.RESET}" for user in users)} CHAT STATISTICS\n{DIVIDER}\n
+Words sent  | {words_sent}
+Emojis sent | {emojis_sent}\n
+TIMELINE:\n{stacked_graph(dict(zip(users, buckets.counts["month"])), buckets.labels["month"], padding=1)}
+{print(day_freq.most_common())}
+Most active day = {day_freq.most_common(1)[0][0]}\n
+AVTIVITY BY WEEKDAY:\n{stacked_graph(dict(zip(users, buckets.counts["weekday"])), buckets.labels["weekday"], padding=1)}
+ACTIVITY BY HOUR:\n{stacked_graph(dict(zip(users, buckets.counts["hour"])), buckets.labels["hour"], padding=1)}
+Avg msg sentiment: {sum(user.sentiment_polarity for user in users)/len(users):.3f}
+(Positive > 0 > Negative)
+""") # color most active day by user that sent most messages during that day
+
+    return result
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Vectorized time bucketing of message timestamps"""
+
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+HOURS = [f"{hour % 12 or 12:02d} {'AM' if hour < 12 else 'PM'}" for hour in range(24)]
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+RESOLUTIONS = ["hour", "weekday", "day", "week", "month", "quarter", "year"]
+FIXED_RESOLUTIONS = {"hour": HOURS, "weekday": WEEKDAYS}
+HOUR_NS = 3_600_000_000_000
+DAY_NS = 24 * HOUR_NS
+EPOCH_WEEKDAY = 3 # 01/01/1970 was a Thursday
+
+
+def bucket_labels(resolution: str, first: int, last: int):
+    """Labels of the calendar buckets first to last, given as bucket codes"""
+
+    codes = np.arange(first, last + 1)
+    if resolution == "day": return list(pd.to_datetime(codes, unit="D").strftime("%d/%m/%y"))
+    if resolution == "week": return list(pd.to_datetime(codes * 7 - EPOCH_WEEKDAY, unit="D").strftime("%d/%m/%y"))
+    if resolution == "month": return [f"{code % 12 + 1:02d}/{code // 12 % 100:02d}" for code in codes]
+    if resolution == "quarter": return [f"Q{code % 4 + 1} {code // 4 % 100:02d}" for code in codes]
+    if resolution == "year": return [str(code) for code in codes]
+    raise ValueError(f"unknown resolution: {resolution}")
+
+
+class TimeBuckets:
+    """Per-user message counts for each time resolution, one row per user and one column per bucket"""
+
+    def __init__(self, resolutions: list[str] = RESOLUTIONS):
+
+        unknown = set(resolutions) - set(RESOLUTIONS)
+        if unknown: raise ValueError(f"unknown resolutions: {', '.join(sorted(unknown))}")
+        self.resolutions = list(resolutions)
+        self.usernames = []
+        self._rows = {}
+        # code of the first bucket of every calendar resolution, buckets run contiguously from it
+        self.origins = {}
+        self.labels = {resolution: FIXED_RESOLUTIONS.get(resolution, []) for resolution in self.resolutions}
+        self.counts = {resolution: np.zeros((0, len(self.labels[resolution])), dtype=np.int64) for resolution in self.resolutions}
+
+    def _codes(self, resolution: str, ns: np.ndarray, days: np.ndarray, calendar: pd.DatetimeIndex, day_index: np.ndarray):
+        """Integer bucket code of every message"""
+
+        if resolution == "hour": return ns // HOUR_NS % 24
+        if resolution == "weekday": return (days + EPOCH_WEEKDAY) % 7
+        if resolution == "day": return days
+        if resolution == "week": return (days + EPOCH_WEEKDAY) // 7
+        # calendar fields are only looked up once per distinct day
+        if resolution == "month": codes = calendar.year * 12 + calendar.month - 1
+        elif resolution == "quarter": codes = calendar.year * 4 + calendar.quarter - 1
+        else: codes = calendar.year
+        return codes.to_numpy(dtype=np.int64)[day_index]
+
+    def add(self, timestamps: pd.Series, users: pd.Series):
+        """Counts more messages, adding rows for new users and buckets for new periods"""
+
+        for user in users.unique():
+            if user not in self._rows:
+                self._rows[user] = len(self.usernames)
+                self.usernames.append(user)
+        user_codes = pd.Categorical(users, categories=self.usernames).codes.astype(np.int64)
+        ns = timestamps.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        days = ns // DAY_NS
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        calendar = pd.DatetimeIndex(unique_days.astype("datetime64[D]"))
+
+        for resolution in self.resolutions:
+            codes = self._codes(resolution, ns, days, calendar, day_index)
+            counts = self.counts[resolution]
+            first, offset = 0, 0
+            if resolution not in FIXED_RESOLUTIONS:
+                old_first = self.origins.get(resolution)
+                ends = [] if old_first is None else [old_first, old_first + counts.shape[1] - 1]
+                if len(codes): ends += [int(codes.min()), int(codes.max())]
+                if ends:
+                    first = self.origins[resolution] = min(ends)
+                    self.labels[resolution] = bucket_labels(resolution, first, max(ends))
+                    if old_first is not None: offset = old_first - first
+
+            grown = np.zeros((len(self.usernames), len(self.labels[resolution])), dtype=np.int64)
+            grown[:counts.shape[0], offset:offset + counts.shape[1]] = counts
+            grown += np.bincount(user_codes * grown.shape[1] + codes - first, minlength=grown.size).reshape(grown.shape)
+            self.counts[resolution] = grown
+
+    def freq(self, resolution: str, username: str):
+        """A user's non-empty buckets as a Counter in bucket order"""
+
+        row = self.counts[resolution][self._rows[username]]
+        labels = self.labels[resolution]
+        return Counter({labels[i]: int(row[i]) for i in np.flatnonzero(row)})
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""flet views of a chat's stats, kept apart from the app so the window opens before pandas and the models load"""
+
+from collections import Counter
+import flet as ft
+import numpy as np
+from analytics import ChatAnalysis, UserStats
+from bargraph import BarLayout
+import profiling
+from query import ChatIndex, RangeStats, month_codes, month_start
+from timebuckets import bucket_labels
+
+BAR_CHAR = "█"
+COLORS = ["#1EB980", "#FF6859", "#FFCF44", "#B15DFF", "#72DEFF"]
+
+class User(UserStats):
+    """Class to represent a chat user"""
+
+    def __init__(self, username: str, analysis: ChatAnalysis, color: str = None):
+
+        super().__init__(username, analysis)
+        self.color = color
+        self.top_hour = self.hour_freq.most_common(1)[0][0]
+
+    def graph_freq(self, freq: Counter, title: str, page: ft.Page):
+        """Returns a Unicode bar graph for a given frequency distribution"""
+
+        if not freq: return ft.Text(None)
+        title = title.title()
+        words, bars = ft.Column(spacing=0), ft.Column(spacing=0)
+        top = freq.most_common(1)[0][1]
+        # total = sum(freq.values())
+        scale = page.window_width/22.5
+        for element, count in freq.most_common(5):
+            len_bar = int(round(count / top * scale))
+            words.controls.append(ft.Row([ft.Text(element)]))
+            bars.controls.append(ft.Row([ft.Text("|"), ft.Text(BAR_CHAR*len_bar, color=self.color, ), ft.Text(count)]))
+        
+        graph = ft.Column([ft.Row([ft.Text(title)], alignment="center"), ft.Row([words, bars])])
+        return graph
+
+    @profiling.profiled("User.display")
+    def display(self, page: ft.Page):
+        """Displays user information"""
+
+        return ft.Column([
+            ft.Row([ft.Text("Messages sent:"), ft.Text(self.num_messages, color=self.color)]),
+            ft.Row([ft.Text("Avg msg length:"), ft.Text(round(self.avg_msg_len, 2), color=self.color), ft.Text("words")]),
+            ft.Row([ft.Text("Longest msg:"), ft.Text(len(self.longest_msg), color=self.color), ft.Text("chars")]),
+            ft.Row([ft.Text("Words sent:"), ft.Text(self.num_words, color=self.color)]),
+            ft.Row([ft.Text("Emojis sent:"), ft.Text(self.num_emojis, color=self.color)]),
+            self.graph_freq(self.word_freq, "top words", page),
+            self.graph_freq(self.emoji_freq, "top emojis", page),
+            ft.Row([ft.Text("Top swear:"), ft.Text(self.top_swear if self.top_swear != None else "None", color=self.color)]),
+            ft.Row([ft.Text("Left on read coefficient:"), ft.Text(NotImplemented, color=self.color)]),
+            ft.Row([ft.Text("Most active at:"), ft.Text(self.top_hour, color=self.color)]),
+            ft.Row([ft.Text("Average message sentiment:"), ft.Text(round(self.sentiment_polarity, 2), color=self.color)])
+            # self.graph_freq(self.emoji_freq, "top emojis")
+        ]) #width=600, alignment="center"
+
+
+def bar_row(runs: list[list], spacing: int = 0):
+    """One stacked bar, a Text per run of the same color"""
+
+    return ft.Row([ft.Text(BAR_CHAR*length, color=color) for color, length in runs], spacing=spacing)
+
+
+@profiling.profiled()
+def stacked_graph(layout: BarLayout, title: str, page: ft.Page):
+    """Returns a Unicode bar graph of a precomputed layout, scaled to the window width"""
+
+    scale = int(round(page.window_width/45))
+    elements, bars = ft.Column(spacing=0), ft.Column(spacing=0)
+    for element, runs in zip(layout.labels, layout.segments(scale)):
+        # only add the bar if it's not empty (it's empty if the length was rounded to 0)
+        if not runs: continue
+        elements.controls.append(ft.Text(element))
+        bars.controls.append(bar_row(runs))
+
+    return ft.Column([ft.Row([ft.Text(title.title())], alignment="center"), ft.Row([elements, bars])])
+
+
+def average_sentiment(users: list[User]):
+    """Average of the users' message sentiment, rounded for display, None for a chat without users"""
+
+    return round(sum(user.sentiment_polarity for user in users)/len(users), 2) if users else None
+
+
+def range_sentiment(stats: RangeStats):
+    """Average message sentiment of the users who wrote in a date range, rounded for display"""
+
+    scores = [score for score in map(stats.sentiment_polarity, stats.users) if not np.isnan(score)]
+    return round(sum(scores)/len(scores), 2) if scores else None
+
+
+@profiling.profiled()
+def chat_stats(users: list[User], stats: ChatAnalysis | RangeStats, page: ft.Page, sentiment: ft.Text = None, layouts: dict = None):
+    """chat statistics of a whole chat or a date range of it, sentiment goes into the given Text when it is scored later
+
+    Bar layouts are kept in layouts, so calling this again for a new window size only rescales them.
+    """
+
+    layouts = {} if layouts is None else layouts
+    colors = [user.color for user in users]
+    buckets = stats.buckets
+    rows = [stats.users.index(user.username) for user in users]
+    def layout(name: str, counts: np.ndarray, labels: list[str]):
+        if name not in layouts: layouts[name] = BarLayout(counts, colors, labels)
+        return layouts[name]
+
+    totals = stats.summary.loc[[user.username for user in users]]
+    words = layout("words", totals[["num_words"]].to_numpy(), [""])
+    emojis = layout("emojis", totals[["num_emojis"]].to_numpy(), [""])
+    words_sent = bar_row(words.segments(15)[0]) if words.labels else ft.Row()
+    emojis_sent = bar_row(emojis.segments(15)[0]) if emojis.labels else ft.Row()
+    day_counts = buckets.counts["day"][rows].sum(axis=0)
+    active_day = buckets.labels["day"][day_counts.argmax()] if day_counts.any() else "None"
+
+    return ft.Column([
+        ft.Row([ft.Text("Words sent |"), words_sent]),
+        ft.Row([ft.Text("Emojis sent |"), emojis_sent]),
+        stacked_graph(layout("month", buckets.counts["month"][rows], buckets.labels["month"]), "timeline", page),
+        ft.Row([ft.Text("Most active day:"), ft.Text(active_day, color=None)]), # color by top user that day
+        stacked_graph(layout("weekday", buckets.counts["weekday"][rows], buckets.labels["weekday"]), "activity by weekday", page),
+        stacked_graph(layout("hour", buckets.counts["hour"][rows], buckets.labels["hour"]), "activity by hour", page),
+        ft.Row([ft.Text("Average message sentiment:"), sentiment or ft.Text(average_sentiment(users))]), # color by top user sentiment
+        ft.Row([ft.Text("(Positive > 0 > Negative)")])
+    ])
+
+
+def chat_users(analysis: ChatAnalysis):
+    """Every user of a chat, colored in turn"""
+
+    return [User(username, analysis, COLORS[i % len(COLORS)]) for i, username in enumerate(analysis.users)]
+
+
+def month_options(index: ChatIndex):
+    """Dropdown options of every month of an indexed chat, keyed by month code"""
+
+    first, last = month_codes(np.array([index.first_day, index.last_day]))
+    return [ft.dropdown.Option(key=str(code), text=label) for code, label in zip(range(first, last + 1), bucket_labels("month", first, last))]
+
+
+def month_range(index: ChatIndex, first_month: int, last_month: int):
+    """Stats of the months first_month to last_month, given as month codes"""
+
+    start, end = month_start([first_month, last_month + 1])
+    return index.query(np.datetime64(int(start), "D"), np.datetime64(int(end) - 1, "D"))